@@ -0,0 +1,237 @@
+"""Offscreen render benchmark for ScreenSnake
+
+Builds game states with the headless engine (or replays a recording) and
+paints the real ScreenSnake widget into a QImage, so no display is needed.
+Cases cover screen resolutions, cell sizes, player lengths, rival counts
+and both themes. Each is run with the theme's logos and with the vector
+fallback look used when logos are missing, at full render quality unless
+--quality pins a lower tier. Every frame advances the game
+one tick and times both a full-window paint and the dirty-region repaint
+the game would issue. Results are written as JSON:
+
+    python bench_render.py --quick
+    python bench_render.py --replay last_game.snakerec
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtCore import QRect
+from PyQt5.QtGui import QImage, QPixmap, QRegion
+from PyQt5.QtWidgets import QApplication
+
+import screen_snake
+from bench_ticks import build_scenario
+from snake_profiler import percentile
+from snake_recording import Recording
+from snake_render import QUALITY_NAMES
+from snake_replay import iter_replay
+
+# (label, screen width, screen height)
+RESOLUTIONS = [
+    ('1080p', 1920, 1080),
+    ('1440p', 2560, 1440),
+    ('4k', 3840, 2160),
+]
+CELL_SIZES = [25, 10]
+PLAYER_LENGTHS = [1, 100, 1000]
+RIVAL_COUNTS = [0, 5, 50]
+SPRITE_MODES = ['logos', 'fallback']
+
+QUICK_RESOLUTIONS = RESOLUTIONS[:1] + RESOLUTIONS[-1:]
+QUICK_CELL_SIZES = [25]
+QUICK_PLAYER_LENGTHS = [1, 1000]
+QUICK_RIVAL_COUNTS = [0, 50]
+
+def make_widget(width, height, cell_size, quality=QUALITY_NAMES[0]):
+    """A ScreenSnake window of the given size and fixed render quality that never runs its own timers or saves files"""
+    widget = screen_snake.ScreenSnake(geometry=QRect(0, 0, width, height), cell_size=cell_size)
+    widget.timer.stop()
+    widget.engine.record_games = False
+    widget.governor.tier = QUALITY_NAMES.index(quality)
+    # Collect repaint requests instead of posting them, to render them ourselves
+    widget.dirty = QRegion()
+    def update(*args):
+        if args:
+            widget.dirty = widget.dirty.united(args[0] if isinstance(args[0], QRegion) else QRegion(args[0]))
+        else:
+            widget.dirty = widget.dirty.united(QRegion(widget.rect()))
+    widget.update = update
+    return widget
+
+def use_sprites(widget, theme, mode):
+    """Show `theme` with its logos, or with every logo missing; returns how many logos are drawn"""
+    widget.switch_theme(theme)
+    widget._apply_theme_assets(widget.theme_assets[theme])
+    if mode == 'fallback':
+        widget.player_head_pixmap = widget.player_body_pixmap = QPixmap()
+        widget.rival_logos = {}
+        widget.food_pixmap_scaled = QPixmap()
+    pixmaps = [widget.player_head_pixmap, widget.player_body_pixmap, widget.food_pixmap_scaled]
+    return sum(not pixmap.isNull() for pixmap in pixmaps) + len(widget.rival_logos)
+
+def scenario_states(widget, player_length, rivals, seed):
+    """Engines for the widget's grid, yielded after every tick; game overs start a fresh scenario"""
+    resets = 0
+    while True:
+        engine, player = build_scenario(widget.grid_width, widget.grid_height, player_length, rivals, seed + resets)
+        # Give rivals the theme's logos so the logo path draws them
+        logos = widget.rival_logo_files
+        for i, ai in enumerate(engine.state.ai_snakes):
+            if logos:
+                ai.logo_file = logos[i % len(logos)]
+        while engine.step(player.next_direction()):
+            if engine.state.game_over:
+                break
+            yield engine
+        resets += 1
+
+def time_frames(widget, states, frames, warmup):
+    """Paint `frames` ticks of `states`, timing full-window paints and dirty-region repaints
+
+    Returns the full and dirty timing summaries and the last engine painted.
+    """
+    image = QImage(widget.size(), QImage.Format_ARGB32_Premultiplied)
+    full, dirty = [], []
+    clock = time.perf_counter_ns
+    engine = None
+    for engine in states:
+        widget.engine = engine
+        state = engine.state
+        changed = engine.take_changed_cells()
+        if widget.player_body_pixmap.isNull() and widget.governor.detail:
+            changed.update(state.snake)
+        widget.dirty = QRegion()
+        widget._update_cells(changed)
+        region = widget.dirty
+
+        image.fill(0)
+        start = clock()
+        widget.render(image)
+        full.append(clock() - start)
+        if not region.isEmpty():
+            start = clock()
+            widget.render(image, region.boundingRect().topLeft(), region)
+            dirty.append(clock() - start)
+        if len(full) >= frames + warmup:
+            break
+    return summarize(full[warmup:]), summarize(dirty[warmup:]), engine
+
+def summarize(timings):
+    if not timings:
+        return None
+    timings = sorted(timings)
+    total_s = sum(timings) / 1e9
+    return {
+        'frames': len(timings),
+        'fps': round(len(timings) / total_s, 1) if total_s else None,
+        'mean_ms': round(sum(timings) / len(timings) / 1e6, 3),
+        'p50_ms': round(percentile(timings, 0.50) / 1e6, 3),
+        'p99_ms': round(percentile(timings, 0.99) / 1e6, 3),
+        'max_ms': round(timings[-1] / 1e6, 3),
+    }
+
+def run_matrix(args, results):
+    resolutions = QUICK_RESOLUTIONS if args.quick else RESOLUTIONS
+    cell_sizes = QUICK_CELL_SIZES if args.quick else CELL_SIZES
+    lengths = QUICK_PLAYER_LENGTHS if args.quick else PLAYER_LENGTHS
+    rival_counts = QUICK_RIVAL_COUNTS if args.quick else RIVAL_COUNTS
+    for label, width, height in resolutions:
+        for cell_size in cell_sizes:
+            widget = make_widget(width, height, cell_size, args.quality)
+            for player_length in lengths:
+                if player_length > widget.grid_width * widget.grid_height // 2:
+                    continue
+                for rivals in rival_counts:
+                    for theme in screen_snake.THEME_IMAGES:
+                        for mode in SPRITE_MODES:
+                            logos = use_sprites(widget, theme, mode)
+                            states = scenario_states(widget, player_length, rivals, args.seed)
+                            full, dirty, _ = time_frames(widget, states, args.frames, args.warmup)
+                            results.append(report(label, widget, player_length, rivals, theme, mode, logos,
+                                                  full, dirty))
+            widget.close()
+
+def run_replay(args, results):
+    """Paint every tick of a recorded game at the screen size it was played on
+
+    Player length and rivals are reported as they were at the end of the game.
+    """
+    recording = Recording.load(args.replay)
+    cell_size = screen_snake.CELL_SIZE
+    widget = make_widget(recording.grid_width * cell_size, recording.grid_height * cell_size, cell_size,
+                         args.quality)
+    for theme in screen_snake.THEME_IMAGES:
+        for mode in SPRITE_MODES:
+            logos = use_sprites(widget, theme, mode)
+            # A replay is as long as the game was; it is not repeated to reach --frames
+            warmup = min(args.warmup, recording.ticks // 2)
+            full, dirty, engine = time_frames(widget, iter_replay(recording), recording.ticks, warmup)
+            results.append(report('replay', widget, len(engine.state.snake), len(engine.state.ai_snakes),
+                                  theme, mode, logos, full, dirty))
+    widget.close()
+
+def report(label, widget, player_length, rivals, theme, mode, logos, full, dirty):
+    case = {
+        'screen': label,
+        'width': widget.width(),
+        'height': widget.height(),
+        'cell_size': widget.cell_size,
+        'player_length': player_length,
+        'rivals': rivals,
+        'theme': theme,
+        'sprites': mode,
+        'quality': widget.governor.name,
+        'logos_drawn': logos,
+        'full': full,
+        'dirty': dirty,
+    }
+    dirty_ms = f"{dirty['p50_ms']:>7.2f}" if dirty else '      -'
+    print(f"{label:>6} cell={widget.cell_size:<3} len={player_length:<5} rivals={rivals:<3} theme={theme} "
+          f"{mode:<8} full {full['fps']:>7.1f} fps p50={full['p50_ms']:>7.2f}ms p99={full['p99_ms']:>7.2f}ms  "
+          f"dirty p50={dirty_ms}ms")
+    return case
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=60, help='timed frames per case')
+    parser.add_argument('--warmup', type=int, default=5, help='untimed frames before each case')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--quick', action='store_true', help='a smaller matrix for a fast check')
+    parser.add_argument('--replay', metavar='RECORDING', help='paint a recorded game instead of the matrix')
+    parser.add_argument('--quality', choices=QUALITY_NAMES, default=QUALITY_NAMES[0],
+                        help='render quality tier to paint at')
+    parser.add_argument('--output', default='bench_render.json')
+    args = parser.parse_args()
+
+    # The game logs missing logos and spawns; keep that out of the output
+    logging.disable(logging.WARNING)
+    app = QApplication(sys.argv[:1])
+    results = []
+    if args.replay:
+        run_replay(args, results)
+    else:
+        run_matrix(args, results)
+
+    report_data = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'qpa_platform': app.platformName(),
+        'frames': args.frames,
+        'warmup': args.warmup,
+        'seed': args.seed,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report_data, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""Tick-throughput benchmark for the ScreenSnake game rules
+
+Runs the Qt-free engine (no display needed) over a matrix of screen sizes,
+player lengths and rival counts, and reports ticks/sec plus p50/p99 per-tick
+latency. Results are written as JSON so two runs can be compared:
+
+    python bench_ticks.py --output before.json
+    python bench_ticks.py --output after.json --compare before.json
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+from snake_engine import AI_FLOOD, AI_GREEDY, Engine
+from snake_profiler import percentile
+
+# (label, screen width, screen height, cell size)
+SCREENS = [
+    ('1080p', 1920, 1080, 25),
+    ('1440p', 2560, 1440, 25),
+    ('4k', 3840, 2160, 25),
+    ('4k-small', 3840, 2160, 10),
+]
+PLAYER_LENGTHS = [1, 10, 100, 1000, 5000]
+RIVAL_COUNTS = [0, 1, 5, 10, 25, 50, 100, 250, 500]
+
+QUICK_SCREENS = SCREENS[:1] + SCREENS[-1:]
+QUICK_PLAYER_LENGTHS = [1, 100, 1000]
+QUICK_RIVAL_COUNTS = [0, 5, 50, 500]
+
+class ScriptedPlayer:
+    """Sweeps the board row by row so a long player never runs into itself
+
+    Each row takes width - 1 moves right followed by one move down, which
+    visits every cell of the row before moving on.
+    """
+    def __init__(self, grid_width):
+        self.grid_width = grid_width
+        self.moves_in_row = 0
+
+    def next_direction(self):
+        self.moves_in_row += 1
+        if self.moves_in_row == self.grid_width:
+            self.moves_in_row = 0
+            return (0, 1)
+        return (1, 0)
+
+def build_scenario(grid_width, grid_height, player_length, rivals, seed, ai_mode=AI_GREEDY, swarm=False):
+    """Engine with a player of the given length laid along the sweep path and N rivals"""
+    random.seed(seed)
+    engine = Engine(grid_width, grid_height, [])
+    engine.ai_mode = ai_mode
+    # Swarm mode moves the rivals in one batched step; the swarm is never refilled here
+    engine.swarm_size = rivals if swarm else 0
+    engine.reset()
+    state = engine.state
+    player = ScriptedPlayer(grid_width)
+    # Grow the player along its own path; food is moved out of the way afterwards
+    for _ in range(player_length - 1):
+        direction = player.next_direction()
+        state.direction = direction
+        head_y, head_x = divmod(state.snake.head, grid_width)
+        cell = state.grid.index(((head_x + direction[0]) % grid_width, (head_y + direction[1]) % grid_height))
+        state.snake.push_head(cell)
+        state.grid.occupy(cell, state.snake.owner)
+    for i in range(rivals):
+        engine._add_ai_snake(engine._find_safe_spawn_position(), f'rival{i}')
+    engine.spawn_food()
+    return engine, player
+
+def run_case(grid_width, grid_height, player_length, rivals, ticks, warmup, seed, ai_mode=AI_GREEDY,
+             swarm=False):
+    """Time `ticks` engine steps; scenarios that end in game over are rebuilt untimed"""
+    engine, player = build_scenario(grid_width, grid_height, player_length, rivals, seed, ai_mode, swarm)
+    timings = []
+    resets = 0
+    ai_deaths = 0
+    step = engine.step
+    clock = time.perf_counter_ns
+    while len(timings) < ticks + warmup:
+        direction = player.next_direction()
+        start = clock()
+        alive = len(engine.state.ai_snakes)
+        step(direction)
+        elapsed = clock() - start
+        if engine.state.game_over:
+            resets += 1
+            engine, player = build_scenario(grid_width, grid_height, player_length, rivals, seed + resets,
+                                            ai_mode, swarm)
+            step = engine.step
+            continue
+        ai_deaths += alive - len(engine.state.ai_snakes)
+        timings.append(elapsed)
+    timings = sorted(timings[warmup:])
+    total_s = sum(timings) / 1e9
+    return {
+        'ticks': len(timings),
+        'ticks_per_sec': round(len(timings) / total_s, 1) if total_s else None,
+        'mean_us': round(sum(timings) / len(timings) / 1000, 2),
+        'p50_us': round(percentile(timings, 0.50) / 1000, 2),
+        'p99_us': round(percentile(timings, 0.99) / 1000, 2),
+        'max_us': round(timings[-1] / 1000, 2),
+        'resets': resets,
+        'final_player_length': len(engine.state.snake),
+        'final_rivals': len(engine.state.ai_snakes),
+        'ai_deaths': ai_deaths,
+        'flood_fills': engine.food_field.fills,
+        'flood_spread_fills': engine.food_field.spread_fills,
+    }
+
+def case_key(case):
+    return (case['screen'], case['cell_size'], case['player_length'], case['rivals'])
+
+def compare(results, baseline_file):
+    """Print the throughput change for every case also present in a previous run"""
+    with open(baseline_file, 'r') as f:
+        baseline = {case_key(case): case for case in json.load(f)['results']}
+    print(f"\nChange vs {baseline_file} (ticks/sec, + is faster):")
+    for case in results:
+        old = baseline.get(case_key(case))
+        if not old or not old['ticks_per_sec'] or not case['ticks_per_sec']:
+            continue
+        change = (case['ticks_per_sec'] / old['ticks_per_sec'] - 1) * 100
+        print(f"  {case['screen']:>8} cell={case['cell_size']:<3} len={case['player_length']:<5} "
+              f"rivals={case['rivals']:<3} {old['ticks_per_sec']:>10.0f} -> {case['ticks_per_sec']:>10.0f} ({change:+.1f}%)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ticks', type=int, default=1000, help='timed ticks per case')
+    parser.add_argument('--warmup', type=int, default=50, help='untimed ticks per case')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--quick', action='store_true', help='run a reduced matrix')
+    parser.add_argument('--ai-mode', choices=[AI_GREEDY, AI_FLOOD], default=AI_GREEDY,
+                        help='how rivals pick their moves')
+    parser.add_argument('--swarm', action='store_true', help='move rivals in one batched NumPy step')
+    parser.add_argument('--output', default='bench_ticks.json', help='JSON results file')
+    parser.add_argument('--compare', metavar='BASELINE', help='previous JSON results to compare against')
+    args = parser.parse_args(argv)
+
+    screens = QUICK_SCREENS if args.quick else SCREENS
+    lengths = QUICK_PLAYER_LENGTHS if args.quick else PLAYER_LENGTHS
+    rival_counts = QUICK_RIVAL_COUNTS if args.quick else RIVAL_COUNTS
+
+    results = []
+    for label, width, height, cell_size in screens:
+        grid_width, grid_height = width // cell_size, height // cell_size
+        for player_length in lengths:
+            # Leave room for rivals and food to move around
+            if player_length > grid_width * grid_height // 2:
+                continue
+            for rivals in rival_counts:
+                stats = run_case(grid_width, grid_height, player_length, rivals,
+                                 args.ticks, args.warmup, args.seed, args.ai_mode, args.swarm)
+                case = {
+                    'screen': label,
+                    'cell_size': cell_size,
+                    'grid_width': grid_width,
+                    'grid_height': grid_height,
+                    'player_length': player_length,
+                    'rivals': rivals,
+                    'ai_mode': args.ai_mode,
+                    'swarm': args.swarm,
+                }
+                case.update(stats)
+                results.append(case)
+                print(f"{label:>8} {grid_width}x{grid_height} len={player_length:<5} rivals={rivals:<3} "
+                      f"{stats['ticks_per_sec']:>10.0f} ticks/s  p50={stats['p50_us']:>8.1f}us  "
+                      f"p99={stats['p99_us']:>8.1f}us  resets={stats['resets']}")
+
+    report = {
+        'meta': {
+            'benchmark': 'ticks',
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'ticks': args.ticks,
+            'warmup': args.warmup,
+            'seed': args.seed,
+            'ai_mode': args.ai_mode,
+            'swarm': args.swarm,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""Pack all ScreenSnake logos into a prebuilt sprite atlas
+
+Run this before packaging (or any time the logos change) so the game can
+load every sprite with one read instead of decoding each PNG:
+
+    python build_atlas.py
+"""
+import argparse
+import os
+import sys
+
+from PyQt5.QtGui import QGuiApplication
+
+from screen_snake import FOOD_IMAGE, THEME_IMAGES, resource_path
+from snake_assets import ATLAS_CELL_SIZES, ATLAS_FILE, build_atlas
+
+def theme_assets():
+    """Every logo any theme can show, including the original theme's *_logo.png rivals"""
+    names = [FOOD_IMAGE]
+    for theme in THEME_IMAGES.values():
+        names += [theme['food'], theme['player_head'], theme['player_body']] + theme['enemies']
+    names += sorted(f for f in os.listdir(resource_path('.')) if f.endswith('_logo.png'))
+    # Keep first occurrences only, in a stable order
+    return [resource_path(name) for name in dict.fromkeys(names)]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(ATLAS_CELL_SIZES),
+                        help='sprite sizes in device pixels')
+    parser.add_argument('--output', default=ATLAS_FILE, help='atlas file (index goes next to it)')
+    args = parser.parse_args(argv)
+
+    app = QGuiApplication(sys.argv[:1])  # QImage scaling and painting need a GUI app
+    index_path = args.output + '.json'
+    count = build_atlas(theme_assets(), args.output, index_path, args.sizes)
+    print(f"Packed {count} sprites into {args.output} ({os.path.getsize(args.output)} bytes) and {index_path}")
+
+if __name__ == '__main__':
+    main()
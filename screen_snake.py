@@ -1,11 +1,25 @@
+import argparse
+import logging
 import sys
 import os
-import random
+import time
 import json
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 from PyQt5.QtWidgets import QApplication, QWidget
-from PyQt5.QtCore import Qt, QRect, QTimer
-from PyQt5.QtGui import QPainter, QColor, QFont, QPixmap, QImage
+from PyQt5.QtCore import Qt, QElapsedTimer, QRect, QTimer, pyqtSignal
+from PyQt5.QtGui import QPainter, QColor, QRegion
 import glob
+from snake_assets import ATLAS_FILE, ATLAS_INDEX_FILE, ColorCache, SpriteAtlas, SpriteCache
+from snake_engine import Engine
+from snake_log import setup_logging
+from snake_profiler import Profiler
+from snake_recording import RECORDING_FILE
+from snake_render import (TIGER_BODY_RGBA, TIGER_HEAD_RGBA, FrameRenderer, FrameSnapshot, HudLayer, RenderGovernor,
+                          ShapeSprites, SpriteBatch)
+
+log = logging.getLogger(__name__)
 
 # Helper for PyInstaller asset paths
 def resource_path(relative_path):
@@ -13,7 +27,6 @@ def resource_path(relative_path):
         return os.path.join(sys._MEIPASS, relative_path)
     return os.path.join(os.path.abspath("."), relative_path)
 
-SPEED = 100     # Base milliseconds per move
 HIGH_SCORE_FILE = 'high_scores.json'
 FOOD_IMAGE = 'princeton_logo.png'
 
@@ -29,6 +42,29 @@ FOOD_IMAGE = 'princeton_logo.png'
 SNAKE_HEAD_IMAGE = 'snake_logo.png'
 SNAKE_BODY_IMAGE = 'snake_logo.png'
 
+CELL_SIZE = 25  # Grid cell size in pixels
+
+# Game loop: the simulation runs fixed engine ticks of current_speed ms
+# and is drawn once per display frame, independently of each other
+DEFAULT_REFRESH_RATE = 60  # Hz, when the screen does not report one
+MAX_CATCH_UP_TICKS = 5  # Ticks run in one frame before the backlog is dropped
+DRIFT_REPORT_INTERVAL = 10000  # ms between tick drift reports
+
+# Profiler overlay (D toggles it, E exports while it is shown)
+PROFILER_POS = (30, 100)
+PROFILER_LINES = 12
+PROFILER_REFRESH = 250  # ms between overlay redraws
+
+# Frames with at least this many body segments and extra food cells draw
+# them as batched pixmap fragments instead of one call per segment
+BATCH_MIN_SEGMENTS = 200
+# Repaints covering more of the board than this draw every segment and let
+# Qt clip them; smaller ones only draw (or batch) the segments under them
+REGION_CULL_SHARE = 0.5
+
+# Sprites kept converted to images for the render thread (--render-thread)
+SPRITE_IMAGE_LIMIT = 256
+
 # Theme constants
 THEME_GIMMEFY = 1  # Default theme for dad's birthday
 THEME_ORIGINAL = 2  # Original college theme
@@ -50,398 +86,438 @@ THEME_IMAGES = {
 }
 
 class ScreenSnake(QWidget):
-    def __init__(self):
+    theme_decoded = pyqtSignal(object)  # Future of a theme decoded on the loader thread
+    
+    def __init__(self, swarm_size=0, seed=None, geometry=None, cell_size=CELL_SIZE, render_thread=False):
         super().__init__()
+        self.frame_renderer = None  # Composes frames off the GUI thread when render_thread is set
         self.setWindowFlags(Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint)
         self.setAttribute(Qt.WA_TranslucentBackground)
-        screen = QApplication.primaryScreen().geometry()
-        self.setGeometry(screen)
+        # Covers the whole primary screen unless told otherwise (bench_render.py)
+        self.setGeometry(geometry or QApplication.primaryScreen().geometry())
         self.show()
         self.setFocusPolicy(Qt.StrongFocus)
         
         # Simple grid setup
         self.screen_width = self.width()
         self.screen_height = self.height()
-        self.cell_size = 25
+        self.cell_size = cell_size
         self.grid_width = self.screen_width // self.cell_size
         self.grid_height = self.screen_height // self.cell_size
         self.offset_x = (self.screen_width - self.grid_width * self.cell_size) // 2
         self.offset_y = (self.screen_height - self.grid_height * self.cell_size) // 2
-        
+        self.body_batch = SpriteBatch((self.offset_x, self.offset_y), self.cell_size, self.grid_width)
+        # Procedural fallback shapes are rasterized once and blitted like logos
+        self.shapes = ShapeSprites()
+        self.shapes.set_device_pixel_ratio(self.devicePixelRatioF())
+        
+        # Score, high scores and overlays are cached text layers
+        self.hud = HudLayer()
+        self.hud.set_device_pixel_ratio(self.devicePixelRatioF())
+        
+        # One timer per display frame; advance_frame works out how many
+        # engine ticks the elapsed wall time is worth. Rival spawns and other
+        # timed events run off the engine's game clock, so this is the only
+        # timer, and it is stopped whenever the game cannot move
+        refresh_rate = QApplication.primaryScreen().refreshRate() or DEFAULT_REFRESH_RATE
+        self.frame_interval = max(1, round(1000 / refresh_rate))
         self.timer = QTimer(self)
-        self.timer.timeout.connect(self.game_step)
-        
-        # Speed management
-        self.base_speed = SPEED
-        self.current_speed = SPEED
-        self.speed_level = 0
-        
-        # AI difficulty management
-        self.ai_reaction_delay = True  # AI has reaction delay initially
-        self.ai_difficulty_threshold = 15  # Remove handicap after 15 points
-        
-        # Load images
-        self.food_pixmap = QPixmap(resource_path(FOOD_IMAGE))
-        if self.food_pixmap.isNull():
-            print(f"Warning: Could not load food image: {FOOD_IMAGE}")
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.advance_frame)
+        self.clock = QElapsedTimer()
+        self.last_frame_ms = 0.0
+        self.accumulator = 0.0
+        self.tick_alpha = 1.0  # How far the game is between the last tick and the next
+        self.head_cells = set()  # Cells the sliding heads were last drawn across
+        self.interpolate = True  # Slide heads between cells instead of jumping
+        self.drift = {'ticks': 0, 'late_total': 0.0, 'late_max': 0.0, 'dropped': 0}
+        self.drift_reported_ms = 0.0
+        # Key press times (clock ms) of turns the engine has taken but no frame has shown yet
+        self.pending_inputs = []
+        
+        # Timings are only collected while the overlay is shown
+        self.profiler = Profiler()
+        self.profiler_rect = self.hud.panel_rect(PROFILER_POS, PROFILER_LINES)
+        self.profiler_refreshed_ms = 0.0
+        # Render quality drops when paints overrun the tick budget and recovers with headroom
+        self.governor = RenderGovernor()
+        
+        # Optional render thread: the game publishes a snapshot when the screen
+        # should change, the thread composes it into an image and paintEvent
+        # only copies the newest finished image to the window
+        if render_thread:
+            self.frame = None
+            self.frame_sequence = 0  # Last snapshot published
+            self.shown_sequence = 0  # Snapshot behind self.frame
+            self.published_inputs = deque()  # (sequence, key press stamps) not yet on screen
+            self.sprite_images = {}
+            self.publish_timer = QTimer(self)
+            self.publish_timer.setSingleShot(True)
+            self.publish_timer.setInterval(0)
+            self.publish_timer.timeout.connect(self._publish_frame)
+            self.frame_renderer = FrameRenderer(self)
+            self.frame_renderer.frame_ready.connect(self._on_frame_ready)
+            self.frame_renderer.start()
+            QApplication.instance().aboutToQuit.connect(self.frame_renderer.stop)
+        
+        # Load images; every logo is scaled once per cell size through the sprite
+        # cache, which slices pre-scaled sprites out of the atlas when one is built
+        atlas = SpriteAtlas.load(resource_path(ATLAS_FILE), resource_path(ATLAS_INDEX_FILE))
+        self.sprites = SpriteCache(atlas=atlas)
+        self.color_cache = ColorCache()
+        self.sprite_dpr = self.devicePixelRatioF()
+        self.food_pixmap_scaled = self._sprite(resource_path(FOOD_IMAGE))
+        if self.food_pixmap_scaled.isNull():
+            log.warning("Could not load food image: %s", FOOD_IMAGE)
         else:
-            print(f"Successfully loaded food image: {FOOD_IMAGE}")
-            self.food_pixmap_scaled = self.food_pixmap.scaled(self.cell_size, self.cell_size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            log.debug("Successfully loaded food image: %s", FOOD_IMAGE)
         
         # Initialize theme system first
         self.current_theme = THEME_GIMMEFY  # Default to Gimmefy theme for dad's birthday
         
-        # Initialize AI snake system
-        self.ai_snakes = []
-        self.spawned_rival_logos = set()
-        self.elapsed_time = 0
-        self.spawn_interval = 60  # seconds
-        self.spawn_timer = QTimer(self)
-        self.spawn_timer.timeout.connect(self.check_spawn_new_rival)
-        self.spawn_timer.start(1000)  # check every second
-        
         # Load initial theme images (this will set up rival logos for normal theme)
+        # and decode the other themes in the background so switching never touches disk
+        self.theme_assets = {}
+        self.theme_futures = {}
+        self.theme_loader = ThreadPoolExecutor(max_workers=1)
+        self.theme_decoded.connect(self._on_theme_decoded)
         self.load_theme_images()
+        self.preload_themes()
+        
+        # Game rules and state live in the Qt-free engine
+        self.engine = Engine(self.grid_width, self.grid_height, self.rival_logo_files)
+        self.engine.swarm_size = swarm_size
+        # Every game is seeded and recorded so it can be replayed with snake_replay.py
+        self.engine.record_games = True
+        self.seed = seed
         
         self.reset_game()
         self.load_high_scores()
+        
+        # Logos are scaled for the screen's pixel ratio; rescale if we move
+        self.windowHandle().screenChanged.connect(self._on_screen_changed)
+    
+    def _sprite(self, path):
+        """Logo scaled to one grid cell for the current pixel ratio"""
+        return self.sprites.get(path, self.cell_size, self.sprite_dpr)
+    
+    def _on_screen_changed(self, screen):
+        """Reload scaled logos when the window lands on a screen with another pixel ratio"""
+        if self.devicePixelRatioF() != self.sprite_dpr:
+            self.sprite_dpr = self.devicePixelRatioF()
+            self.hud.set_device_pixel_ratio(self.sprite_dpr)
+            self.shapes.set_device_pixel_ratio(self.sprite_dpr)
+            # Every warm theme was scaled for the old ratio
+            self.theme_assets = {}
+            self.theme_futures = {}
+            self.load_theme_images()
+            self.preload_themes()
+            self.update()
     
     def load_theme_images(self):
-        """Load images for the current theme"""
-        theme = THEME_IMAGES[self.current_theme]
-        print(f"Loading theme {self.current_theme}: {theme}")
-        
-        # Load food image
-        try:
-            self.food_pixmap = QPixmap(resource_path(theme['food']))
-            if not self.food_pixmap.isNull():
-                self.food_pixmap_scaled = self.food_pixmap.scaled(self.cell_size, self.cell_size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-                print(f"Loaded food image: {theme['food']}")
-        except Exception as e:
-            print(f"Error loading food image: {e}")
-            # Fallback to Gimmefy theme if image not found
-            fallback_theme = THEME_IMAGES[THEME_GIMMEFY]
-            self.food_pixmap = QPixmap(resource_path(fallback_theme['food']))
-            if not self.food_pixmap.isNull():
-                self.food_pixmap_scaled = self.food_pixmap.scaled(self.cell_size, self.cell_size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-        
-        # Load player snake images
+        """Load images for the current theme (blocks until they are decoded)"""
+        log.debug("Loading theme %d: %s", self.current_theme, THEME_IMAGES[self.current_theme])
+        assets = self._install_theme(self._decode_theme(self.current_theme, self.sprite_dpr))
+        self._apply_theme_assets(assets)
+    
+    def preload_themes(self):
+        """Decode every other theme on a worker thread so switching to it is instant"""
+        for theme_id in THEME_IMAGES:
+            if theme_id in self.theme_assets or theme_id in self.theme_futures:
+                continue
+            future = self.theme_loader.submit(self._decode_theme, theme_id, self.sprite_dpr)
+            self.theme_futures[theme_id] = future
+            # Hand the result to the GUI thread; QPixmaps cannot be made anywhere else
+            future.add_done_callback(self.theme_decoded.emit)
+    
+    def _on_theme_decoded(self, future):
         try:
-            self.player_head_pixmap = QPixmap(resource_path(theme['player_head']))
-            self.player_body_pixmap = QPixmap(resource_path(theme['player_body']))
-            print(f"Loaded player snake images: {theme['player_head']}, {theme['player_body']}")
-            if self.player_head_pixmap.isNull():
-                print(f"Warning: player_head_pixmap is null for {theme['player_head']}")
-            if self.player_body_pixmap.isNull():
-                print(f"Warning: player_body_pixmap is null for {theme['player_body']}")
+            decoded = future.result()
         except Exception as e:
-            print(f"Error loading player snake images: {e}")
-            fallback_theme = THEME_IMAGES[THEME_GIMMEFY]
-            self.player_head_pixmap = QPixmap(resource_path(fallback_theme['player_head']))
-            self.player_body_pixmap = QPixmap(resource_path(fallback_theme['player_body']))
-        
-        # Update rival logos based on theme
-        self._load_rival_logos_for_theme()
+            log.error("Error preloading theme: %s", e)
+            return
+        theme_id = decoded['theme']
+        if self.theme_futures.get(theme_id) is future:
+            del self.theme_futures[theme_id]
+            self._install_theme(decoded)
     
-    def _load_rival_logos_for_theme(self):
-        """Load rival logo images for the current theme"""
-        theme = THEME_IMAGES[self.current_theme]
-        
-        # Clear existing rival logos
-        self.rival_logos = {}
-        self.rival_colors = {}
-        
-        if self.current_theme == THEME_ORIGINAL:
+    def _theme_files(self, theme_id):
+        """Food, player head, player body and rival logo paths of a theme"""
+        theme = THEME_IMAGES[theme_id]
+        if theme_id == THEME_ORIGINAL:
             # For original theme, use the old system with college logos
             logo_dir = resource_path('.')
-            self.rival_logo_files = [os.path.join(logo_dir, f) for f in os.listdir(logo_dir) if f.endswith('_logo.png') and 'princeton' not in f]
-            self._load_rival_logos()  # This loads the college logos
+            rivals = [os.path.join(logo_dir, f) for f in os.listdir(logo_dir) if f.endswith('_logo.png') and 'princeton' not in f]
         else:
             # For Gimmefy theme, use the new system with tech company logos
-            for enemy_img in theme['enemies']:
-                try:
-                    logo_file = resource_path(enemy_img)
-                    pixmap = QPixmap(logo_file)
-                    if not pixmap.isNull():
-                        scaled_pixmap = pixmap.scaled(self.cell_size, self.cell_size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-                        self.rival_logos[logo_file] = scaled_pixmap
-                        self.rival_colors[logo_file] = self._extract_dominant_color(logo_file)
-                    else:
-                        print(f"Warning: Could not load rival logo: {enemy_img}")
-                except Exception as e:
-                    print(f"Error loading rival logo {enemy_img}: {e}")
-            
-            # Update rival logo files list for tech theme
-            self.rival_logo_files = list(self.rival_logos.keys())
-
-    def _load_rival_logos(self):
-        """Load rival logo images for normal theme"""
-        # This method is still needed for the normal theme (option 1)
-        for logo_file in self.rival_logo_files:
-            pixmap = QPixmap(logo_file)
-            if not pixmap.isNull():
-                scaled_pixmap = pixmap.scaled(self.cell_size, self.cell_size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-                self.rival_logos[logo_file] = scaled_pixmap
-                self.rival_colors[logo_file] = self._extract_dominant_color(logo_file)
-            else:
-                print(f"Warning: Could not load rival logo: {logo_file}")
-
-    def _extract_dominant_color(self, filename):
-        """Extract dominant color from logo"""
-        image = QImage(filename)
-        color_count = {}
-        for x in range(0, image.width(), 4):  # Sample every 4th pixel for speed
-            for y in range(0, image.height(), 4):
-                color = image.pixelColor(x, y)
-                if color.alpha() > 200:  # Only non-transparent pixels
-                    rgb = (color.red(), color.green(), color.blue())
-                    color_count[rgb] = color_count.get(rgb, 0) + 1
-        if color_count:
-            dominant = max(color_count, key=color_count.get)
-            return QColor(*dominant, 220)
-        return QColor(128, 128, 128, 220)
-
-    def _calculate_speed(self, score):
-        """Calculate speed based on score - faster every 5 points"""
-        speed_level = score // 5
-        speed_increase = speed_level * 10  # 10ms faster per level
-        new_speed = max(30, self.base_speed - speed_increase)  # Minimum 30ms
-        return new_speed, speed_level
-
-    def _update_speed(self):
-        """Update game speed based on current score"""
-        new_speed, new_level = self._calculate_speed(self.score)
-        if new_speed != self.current_speed:
-            self.current_speed = new_speed
-            self.speed_level = new_level
-            self.timer.setInterval(self.current_speed)
-            print(f"Speed increased! Level {self.speed_level}, Speed: {self.current_speed}ms")
-        
-        # Check if AI should become smarter
-        if self.ai_reaction_delay and self.score >= self.ai_difficulty_threshold:
-            self.ai_reaction_delay = False
-            print("AI snakes are now at full intelligence!")
-
+            rivals = [resource_path(f) for f in theme['enemies']]
+        return (resource_path(theme['food']), resource_path(theme['player_head']),
+                resource_path(theme['player_body']), rivals)
+    
+    def _decode_theme(self, theme_id, device_pixel_ratio):
+        """Scaled QImages and dominant colors for a theme; safe to run off the GUI thread"""
+        food, head, body, rivals = self._theme_files(theme_id)
+        images = {}
+        for path in [food, head, body] + rivals:
+            if path not in images:
+                images[path] = self.sprites.decode(path, self.cell_size, device_pixel_ratio)
+        colors = {path: self.color_cache.get(path) for path in rivals if not images[path].isNull()}
+        return {'theme': theme_id, 'dpr': device_pixel_ratio, 'food': food, 'player_head': head,
+                'player_body': body, 'rivals': rivals, 'images': images, 'colors': colors}
+    
+    def _install_theme(self, decoded):
+        """Turn a decoded theme into pixmaps and keep it warm for switch_theme"""
+        dpr = decoded['dpr']
+        pixmaps = {path: self.sprites.put(path, self.cell_size, dpr, image)
+                   for path, image in decoded['images'].items()}
+        assets = {
+            'food': pixmaps[decoded['food']],
+            'player_head': pixmaps[decoded['player_head']],
+            'player_body': pixmaps[decoded['player_body']],
+            'rival_logos': {},
+            'rival_colors': {},
+        }
+        if assets['player_head'].isNull():
+            log.warning("player_head_pixmap is null for %s", decoded['player_head'])
+        if assets['player_body'].isNull():
+            log.warning("player_body_pixmap is null for %s", decoded['player_body'])
+        for logo_file in decoded['rivals']:
+            if pixmaps[logo_file].isNull():
+                log.warning("Could not load rival logo: %s", logo_file)
+                continue
+            assets['rival_logos'][logo_file] = pixmaps[logo_file]
+            dominant = decoded['colors'][logo_file]
+            assets['rival_colors'][logo_file] = QColor(*dominant, 220) if dominant else QColor(128, 128, 128, 220)
+        if decoded['theme'] == THEME_ORIGINAL:
+            assets['rival_logo_files'] = decoded['rivals']
+        else:
+            # Tech theme only spawns rivals whose logos loaded
+            assets['rival_logo_files'] = list(assets['rival_logos'])
+        if dpr == self.sprite_dpr:
+            self.theme_assets[decoded['theme']] = assets
+        self.color_cache.save()
+        return assets
+    
+    def _apply_theme_assets(self, assets):
+        """Point the renderer at a theme's already scaled pixmaps"""
+        if not assets['food'].isNull():
+            self.food_pixmap_scaled = assets['food']
+        self.player_head_pixmap = assets['player_head']
+        self.player_body_pixmap = assets['player_body']
+        self.rival_logos = assets['rival_logos']
+        self.rival_colors = assets['rival_colors']
+        self.rival_logo_files = assets['rival_logo_files']
+    
     def reset_game(self):
         """Reset the game state"""
-        self.snake = [(self.grid_width // 2, self.grid_height // 2)]
-        self.direction = (1, 0)
-        self.next_direction = self.direction
-        self.ai_snakes = []
-        self.spawned_rival_logos = set()
-        self.elapsed_time = 0
-        self.score = 0
-        self.paused = False
-        self.game_over = False
-        self.extra_food = set()
-        
-        # Reset speed
-        self.current_speed = self.base_speed
-        self.speed_level = 0
-        
-        # Reset AI difficulty
-        self.ai_reaction_delay = True
-        
-        # Spawn initial AI snake using current theme
-        if self.rival_logo_files:
-            logo_file = random.choice(self.rival_logo_files)
-            self.spawned_rival_logos.add(logo_file)
-            start_pos = self._find_safe_spawn_position()
-            ai_snake = {
-                'body': [start_pos],
-                'direction': random.choice([(1, 0), (-1, 0), (0, 1), (0, -1)]),
-                'logo_pixmap': self.rival_logos.get(logo_file),
-                'color': self.rival_colors.get(logo_file, QColor(128, 128, 128, 220))
-            }
-            self.ai_snakes.append(ai_snake)
-            print(f"Spawned AI snake with logo: {logo_file}")
-        
-        self.spawn_food()
-        self.timer.start(self.current_speed)
+        self.engine.reset(self.seed)
+        self.engine.take_changed_cells()
+        self.clock.start()
+        self.last_frame_ms = self.drift_reported_ms = 0.0
+        self.accumulator = 0.0
+        self.tick_alpha = 1.0
+        self.pending_inputs = []
+        if self.frame_renderer is not None:
+            self.published_inputs.clear()
+        self._sync_timer()
         self.update()
+    
+    def _sync_timer(self):
+        """Run the frame timer only while the game is being played
 
-    def _find_safe_spawn_position(self):
-        """Find a safe position to spawn AI snake"""
-        for attempt in range(50):
-            x = random.randint(0, self.grid_width - 1)
-            y = random.randint(0, self.grid_height - 1)
-            pos = (x, y)
-            if (pos not in self.snake and 
-                (not hasattr(self, 'food') or pos != self.food) and
-                all(pos not in ai['body'] for ai in self.ai_snakes)):
-                return pos
-        return (0, 0)  # Fallback
-
-    def spawn_food(self):
-        """Spawn food at random position"""
-        while True:
-            x = random.randint(0, self.grid_width - 1)
-            y = random.randint(0, self.grid_height - 1)
-            food = (x, y)
-            if (food not in self.snake and 
-                all(food not in ai['body'] for ai in self.ai_snakes) and 
-                food not in self.extra_food):
-                self.food = food
+        Paused, unfocused and finished games get no timer wakeups at all;
+        on resuming, the time spent stopped is not owed to the simulation.
+        """
+        state = self.engine.state
+        if state.paused or state.game_over:
+            if self.timer.isActive():
+                self.timer.stop()
+                self.accumulator = 0.0
+                if self.tick_alpha != 1.0:
+                    # Heads snap to their cells
+                    self.tick_alpha = 1.0
+                    self._update_cells(self.head_cells)
+        elif not self.timer.isActive():
+            self.last_frame_ms = self.clock.nsecsElapsed() / 1e6
+            self.accumulator = 0.0
+            self.timer.start(self.frame_interval)
+    
+    def advance_frame(self):
+        """Run as many fixed ticks as wall time calls for, then redraw the moving heads"""
+        now = self.clock.nsecsElapsed() / 1e6
+        elapsed = now - self.last_frame_ms
+        self.last_frame_ms = now
+        state = self.engine.state
+        self.accumulator += elapsed
+        ticks = 0
+        while self.accumulator >= state.current_speed:
+            if ticks == MAX_CATCH_UP_TICKS:
+                # Too far behind (a stall or a very slow machine); rather than
+                # fast-forward through the backlog, let the game slow down
+                self.drift['dropped'] += int(self.accumulator // state.current_speed)
+                self.accumulator %= state.current_speed
                 break
+            # How long after it was due this tick actually runs
+            late = self.accumulator - state.current_speed
+            self.accumulator -= state.current_speed
+            self.game_step()
+            ticks += 1
+            self.drift['ticks'] += 1
+            self.drift['late_total'] += late
+            self.drift['late_max'] = max(self.drift['late_max'], late)
+            if state.game_over:
+                return
+        
+        if now - self.drift_reported_ms >= DRIFT_REPORT_INTERVAL:
+            self.report_drift()
+            self.drift_reported_ms = now
+        if self.governor.adjust(state.current_speed, self.frame_interval):
+            self._apply_quality()
+        if self.profiler.enabled and now - self.profiler_refreshed_ms >= PROFILER_REFRESH * self.governor.hud_interval_scale:
+            self.update(self.profiler_rect)
+            self.profiler_refreshed_ms = now
+        if self.interpolate and self.governor.detail:
+            # Repaint where heads were drawn last frame as well as where they are now
+            self.tick_alpha = min(1.0, self.accumulator / state.current_speed)
+            head_cells = self._moving_head_cells()
+            self._update_cells(head_cells | self.head_cells)
+            self.head_cells = head_cells
+    
+    def _apply_quality(self):
+        """Redraw everything in the render quality the governor just picked"""
+        log.debug("Render quality now %s (paint budget %.1f ms)", self.governor.name, self.governor.budget_ms)
+        if not self.governor.detail:
+            # Heads stop sliding and snap to their cells
+            self.tick_alpha = 1.0
+            self.head_cells = set()
+        self.update()
+    
+    def report_drift(self):
+        """Log how late ticks ran since the last report, and how many were dropped"""
+        drift = self.drift
+        if drift['ticks']:
+            log.debug("Tick drift: %d ticks, mean %.1fms late, max %.1fms, %d dropped", drift['ticks'],
+                      drift['late_total'] / drift['ticks'], drift['late_max'], drift['dropped'])
+        self.drift = {'ticks': 0, 'late_total': 0.0, 'late_max': 0.0, 'dropped': 0}
+    
+    def _head_motion(self, snake, direction=None):
+        """Cell a snake's head is moving from and the (dx, dy) step, or None if it jumped"""
+        if len(snake) > 1:
+            previous = snake[1]
+        elif direction is not None:
+            # A lone head has no neck; step back against its direction instead
+            y, x = divmod(snake.head, self.grid_width)
+            previous = ((y - direction[1]) % self.grid_height) * self.grid_width + (x - direction[0]) % self.grid_width
+        else:
+            return None
+        y, x = divmod(snake.head, self.grid_width)
+        prev_y, prev_x = divmod(previous, self.grid_width)
+        dx, dy = x - prev_x, y - prev_y
+        # Wrapping across a screen edge is drawn as a jump
+        if abs(dx) + abs(dy) != 1:
+            return None
+        return previous, (dx, dy)
+    
+    def _moving_head_cells(self):
+        """Cells each head is sliding across this frame"""
+        state = self.engine.state
+        cells = set()
+        for snake, direction in [(state.snake, state.direction)] + [(ai, None) for ai in state.ai_snakes]:
+            motion = self._head_motion(snake, direction)
+            if motion is not None:
+                cells.add(snake.head)
+                cells.add(motion[0])
+        return cells
+    
+    def _head_offset(self, snake, direction=None):
+        """Pixels to draw a head back from its cell so it slides in between ticks"""
+        if self.tick_alpha >= 1.0:
+            return 0, 0
+        motion = self._head_motion(snake, direction)
+        if motion is None:
+            return 0, 0
+        dx, dy = motion[1]
+        back = round((1.0 - self.tick_alpha) * self.cell_size)
+        return -dx * back, -dy * back
 
     def game_step(self):
         """Main game loop step"""
-        if self.paused or self.game_over:
+        state = self.engine.state
+        old_score = state.score
+        if not self.engine.step():
             return
+        self.pending_inputs.extend(self.engine.take_applied_inputs())
         
-        # Move player snake
-        self.direction = self.next_direction
-        head_x, head_y = self.snake[0]
-        dx, dy = self.direction
-        new_head = ((head_x + dx) % self.grid_width, (head_y + dy) % self.grid_height)
-        
-        # Check collision
-        if (new_head in self.snake or 
-            any(new_head in ai['body'] for ai in self.ai_snakes)):
-            self.game_over = True
+        changed = self.engine.take_changed_cells()
+        if state.game_over:
             self.save_high_score()
-            self.timer.stop()
+            self.save_recording()
+            self._sync_timer()
+            self.tick_alpha = 1.0
+            self.report_drift()
             self.update()
             return
         
-        self.snake = [new_head] + self.snake
-        
-        # Check food eating
-        ate_food = False
-        if new_head == self.food:
-            self.score += 1
-            self.spawn_food()
-            ate_food = True
-            # Check if speed should increase
-            self._update_speed()
-        elif new_head in self.extra_food:
-            self.score += 1
-            self.extra_food.remove(new_head)
-            ate_food = True
-            # Check if speed should increase
-            self._update_speed()
-        
-        if not ate_food:
-            self.snake.pop()
-        
-        # Move AI snakes (simplified)
-        dead_ai_indices = []
-        for idx, ai in enumerate(self.ai_snakes):
-            if not ai['body']:
-                continue
-            self._move_ai_snake(ai)
-            
-            # Check AI collision
-            ai_head = ai['body'][0]
-            if ai_head in self.snake or ai_head in ai['body'][1:]:
-                self.extra_food.update(ai['body'][1:])
-                dead_ai_indices.append(idx)
-            elif ai_head == self.food:
-                # AI snake eats food - let it grow
-                self.spawn_food()
-            else:
-                # AI snake didn't eat food, remove tail
-                ai['body'].pop()
-        
-        # Remove dead AI snakes
-        for idx in sorted(dead_ai_indices, reverse=True):
-            print(f"AI snake {idx} died")
-            del self.ai_snakes[idx]
-        
-        # Debug: print AI snake count
-        if len(self.ai_snakes) == 0:
-            print(f"No AI snakes remaining. Elapsed time: {self.elapsed_time}")
-        
-        self.update()
+        # Only repaint what moved; the fallback tiger stripes alternate by
+        # segment index, so every segment changes when they are in use
+        if self.player_body_pixmap.isNull() and self.governor.detail:
+            changed.update(state.snake)
+        self._update_cells(changed)
+        if state.score != old_score:
+            self.update(self.hud.score_rect(old_score))
+            self.update(self.hud.score_rect(state.score))
 
-    def _move_ai_snake(self, ai):
-        """Simple AI movement with reaction delay"""
-        if not ai['body']:
+    def _update_cells(self, cells):
+        """Schedule a repaint of just the given grid cells"""
+        if not cells:
             return
-        
-        head_x, head_y = ai['body'][0]
-        fx, fy = self.food
-        
-        # Check if player is very close (for reaction delay)
-        player_head = self.snake[0]
-        distance_to_player = abs(head_x - player_head[0]) + abs(head_y - player_head[1])
-        player_is_close = distance_to_player <= 2  # Within 2 grid spaces
-        
-        # Simple movement toward food
-        possible_moves = []
-        for dx, dy in [(0, -1), (0, 1), (-1, 0), (1, 0)]:
-            nx = (head_x + dx) % self.grid_width
-            ny = (head_y + dy) % self.grid_height
-            new_pos = (nx, ny)
-            
-            if (new_pos not in ai['body'] and 
-                new_pos not in self.snake and
-                all(new_pos not in other['body'] for other in self.ai_snakes)):
-                dist = abs(nx - fx) + abs(ny - fy)
-                possible_moves.append(((dx, dy), dist))
-        
-        if possible_moves:
-            # Choose move closest to food
-            possible_moves.sort(key=lambda x: x[1])
-            dx, dy = possible_moves[0][0]
-            
-            # Apply reaction delay if enabled and player is close
-            if self.ai_reaction_delay and player_is_close:
-                # 50% chance to not move when player is close (reaction delay)
-                if random.random() < 0.5:
-                    dx, dy = 0, 0
-        else:
-            # No safe move, don't move
-            dx, dy = 0, 0
-        
-        new_head = ((head_x + dx) % self.grid_width, (head_y + dy) % self.grid_height)
-        ai['body'] = [new_head] + ai['body']
+        # QRegion.setRects needs y-x sorted bands with no rects touching
+        # side by side, so merge horizontal runs of cells within a row
+        rects = []
+        run_start = prev = None
+        for cell in sorted(cells):
+            if prev is not None and cell == prev + 1 and cell % self.grid_width:
+                prev = cell
+                continue
+            if prev is not None:
+                rects.append(self._cell_run_rect(run_start, prev))
+            run_start = prev = cell
+        rects.append(self._cell_run_rect(run_start, prev))
+        region = QRegion()
+        region.setRects(rects)
+        self.update(region)
 
-    def check_spawn_new_rival(self):
-        """Spawn new rival snake every 60 seconds"""
-        if self.game_over or self.paused:
-            return
-        
-        self.elapsed_time += 1
-        if self.elapsed_time % self.spawn_interval == 0:
-            available_logos = [f for f in self.rival_logo_files if f not in self.spawned_rival_logos]
-            if available_logos:
-                logo_file = random.choice(available_logos)
-                self.spawned_rival_logos.add(logo_file)
-                start_pos = self._find_safe_spawn_position()
-                ai_snake = {
-                    'body': [start_pos],
-                    'logo_file': logo_file,
-                    'logo_pixmap': self.rival_logos[logo_file],
-                    'color': self.rival_colors[logo_file],
-                }
-                self.ai_snakes.append(ai_snake)
-                print(f"Spawned new rival snake with logo: {logo_file}")
-            else:
-                print(f"No more logos available to spawn. All spawned: {self.spawned_rival_logos}")
-        
-        # Debug: print current AI snake count every 10 seconds
-        if self.elapsed_time % 10 == 0:
-            print(f"Time: {self.elapsed_time}s, AI snakes: {len(self.ai_snakes)}")
+    def _cell_run_rect(self, first, last):
+        y, x = divmod(first, self.grid_width)
+        return QRect(self.offset_x + x * self.cell_size, self.offset_y + y * self.cell_size,
+                     (last - first + 1) * self.cell_size, self.cell_size)
 
     def keyPressEvent(self, event):
         """Handle keyboard input"""
+        state = self.engine.state
         if event.key() in DIRECTIONS:
-            new_dir = DIRECTIONS[event.key()]
-            if (new_dir[0] != -self.direction[0] or new_dir[1] != -self.direction[1]) or len(self.snake) == 1:
-                self.next_direction = new_dir
+            # Stamp the press so the frame showing the turn can measure its latency;
+            # presses while paused would count the pause, so they are not stamped
+            stamp = None if state.paused else self.clock.nsecsElapsed() / 1e6
+            self.engine.steer(DIRECTIONS[event.key()], stamp)
         elif event.key() == Qt.Key_P:
-            self.paused = not self.paused
+            self.engine.set_paused(not state.paused)
+            self._sync_timer()
             self.update()
-        elif event.key() == Qt.Key_1 and self.paused:
+        elif event.key() == Qt.Key_1 and state.paused:
             # Switch to Gimmefy theme (default)
             self.switch_theme(THEME_GIMMEFY)
-        elif event.key() == Qt.Key_2 and self.paused:
+        elif event.key() == Qt.Key_2 and state.paused:
             # Switch to original college theme
             self.switch_theme(THEME_ORIGINAL)
         elif event.key() == Qt.Key_Space:
-            if self.game_over:
+            if state.game_over:
                 self.reset_game()
+        elif event.key() == Qt.Key_D:
+            self.toggle_profiler()
+        elif event.key() == Qt.Key_E and self.profiler.enabled:
+            json_path, csv_path = self.profiler.export(extra=self._profile_snapshot())
+            log.info("Wrote profile to %s and %s", json_path, csv_path)
         elif event.key() == Qt.Key_Escape:
             QApplication.quit()
 
@@ -451,196 +527,332 @@ class ScreenSnake(QWidget):
 
     def focusOutEvent(self, event):
         """Pause when window loses focus"""
-        self.paused = True
+        self.engine.set_paused(True)
+        self._sync_timer()
         self.update()
 
     def focusInEvent(self, event):
         """Resume when window gains focus"""
         self.update()
     
+    def toggle_profiler(self):
+        """Show or hide the profiler overlay; nothing is timed while it is hidden"""
+        if self.profiler.enabled:
+            self.profiler.disable()
+        else:
+            self.profiler.enable(
+                timed=[(self, 'game_step', 'game_step', lambda: self.engine.state.current_speed),
+                       (self, 'paintEvent', 'paint', lambda: self.frame_interval)],
+                accumulated=[(self.engine, '_move_ai_snake', 'move_ai'),
+                             (self.engine, '_plan_ai_moves', 'move_ai')])
+        self.update(self.profiler_rect)
+    
+    def _profile_snapshot(self):
+        """Live counts and cache statistics shown next to the timings"""
+        state = self.engine.state
+        return {
+            'player_segments': len(state.snake),
+            'ai_snakes': len(state.ai_snakes),
+            'ai_segments': sum(len(ai) for ai in state.ai_snakes),
+            'extra_food': len(state.extra_food),
+            'tick_ms': state.current_speed,
+            'frame_ms': self.frame_interval,
+            'dropped_ticks': self.drift['dropped'],
+            'dropped_inputs': state.dropped_inputs,
+            'sprite_cache': self.sprites.stats(),
+            'hud_cache': self.hud.stats(),
+            'shape_sprites': self.shapes.stats(),
+            'render_quality': self.governor.stats(),
+            'warm_themes': len(self.theme_assets),
+        }
+    
+    def _profiler_lines(self):
+        snapshot = self._profile_snapshot()
+        sprites, hud, quality = snapshot['sprite_cache'], snapshot['hud_cache'], snapshot['render_quality']
+        return self.profiler.overlay_lines() + [
+            f"player {snapshot['player_segments']} seg  rivals {snapshot['ai_snakes']} "
+            f"({snapshot['ai_segments']} seg)  food {snapshot['extra_food']}",
+            f"tick {snapshot['tick_ms']}ms  frame {snapshot['frame_ms']}ms  "
+            f"dropped ticks {snapshot['dropped_ticks']}  inputs {snapshot['dropped_inputs']}",
+            f"sprites {sprites['entries']} ({sprites['hit_rate']:.0%} hits)  "
+            f"hud {hud['layers']} ({hud['hit_rate']:.0%} hits)  themes {snapshot['warm_themes']}",
+            f"quality {quality['tier']}  paint budget {quality['budget_ms']}ms  "
+            f"changes {quality['changes']}",
+        ]
+    
     def switch_theme(self, new_theme):
         """Switch to a new theme and reload all images"""
         if new_theme != self.current_theme:
-            print(f"Switching from theme {self.current_theme} to theme {new_theme}")
+            log.debug("Switching from theme %d to theme %d", self.current_theme, new_theme)
             self.current_theme = new_theme
-            # Clear all existing AI snakes to prevent visual artifacts
-            self.ai_snakes = []
-            self.spawned_rival_logos = set()
-            self.elapsed_time = 0
-            # Reload theme images (this updates player snake images too)
-            self.load_theme_images()
-            # Spawn a fresh AI snake with new theme
-            if self.rival_logo_files:
-                logo_file = random.choice(self.rival_logo_files)
-                self.spawned_rival_logos.add(logo_file)
-                start_pos = self._find_safe_spawn_position()
-                if start_pos:
-                    self.ai_snakes.append({
-                        'body': [start_pos],
-                        'direction': random.choice([(1, 0), (-1, 0), (0, 1), (0, -1)]),
-                        'logo_pixmap': self.rival_logos.get(logo_file),
-                        'color': self.rival_colors.get(logo_file, QColor(128, 128, 128, 220))
-                    })
+            # Swap in the preloaded images, waiting for the loader if it is not done yet
+            assets = self.theme_assets.get(new_theme)
+            if assets is None:
+                future = self.theme_futures.pop(new_theme, None)
+                decoded = future.result() if future else self._decode_theme(new_theme, self.sprite_dpr)
+                assets = self._install_theme(decoded)
+            self._apply_theme_assets(assets)
+            # Clear all existing AI snakes and spawn a fresh one with the new theme
+            self.engine.switch_rivals(self.rival_logo_files)
+            self.engine.take_changed_cells()
             # Force a screen update to show the new theme
             self.update()
     
-    def update_ai_snake_images(self):
-        """Update AI snake images to match current theme"""
-        theme = THEME_IMAGES[self.current_theme]
-        for ai in self.ai_snakes:
-            if ai.get('body'):  # Make sure AI snake has a body
-                # Pick a random enemy image for this AI snake
-                enemy_img = random.choice(theme['enemies'])
-                try:
-                    ai['logo_pixmap'] = QPixmap(resource_path(enemy_img))
-                    # Generate a color based on the image (fallback)
-                    ai['color'] = QColor(random.randint(100, 200), random.randint(100, 200), random.randint(100, 200), 220)
-                except:
-                    # Fallback to normal theme if image not found
-                    fallback_img = THEME_IMAGES[THEME_NORMAL]['enemies'][0]
-                    ai['logo_pixmap'] = QPixmap(resource_path(fallback_img))
-                    ai['color'] = QColor(128, 128, 128, 200)
-
     def paintEvent(self, event):
+        if self.frame_renderer is not None:
+            self._blit_frame(event)
+            return
+        started = time.perf_counter()
         try:
+            state = self.engine.state
             painter = QPainter(self)
             painter.setCompositionMode(QPainter.CompositionMode_Source)
-            painter.fillRect(self.rect(), Qt.transparent)
+            # Qt clips painting to the update region; cells outside it are
+            # skipped without issuing (or batching) any draw calls
+            clip = event.rect()
+            painter.fillRect(clip, Qt.transparent)
+            clip_left, clip_top = clip.left() - self.cell_size, clip.top() - self.cell_size
+            clip_right, clip_bottom = clip.right(), clip.bottom()
+            visible = self._region_cells(event.region())
             
             # Draw score
-            painter.setPen(QColor(255, 255, 255, 240))
-            painter.setFont(QFont('Arial', 28, QFont.Bold))
-            painter.drawText(30, 80, f'Score: {self.score}')
-            
-            # Draw AI snakes
-            for ai in self.ai_snakes:
-                for i, (x, y) in enumerate(ai['body']):
-                    px = self.offset_x + x * self.cell_size
-                    py = self.offset_y + y * self.cell_size
-                    if i == 0:  # Head
-                        logo_pixmap = ai.get('logo_pixmap')
-                        if logo_pixmap and not logo_pixmap.isNull():
-                            painter.drawPixmap(px, py, logo_pixmap)
-                        else:
-                            painter.setBrush(ai.get('color', QColor(128, 128, 128, 220)))
-                            painter.setPen(Qt.NoPen)
-                            painter.drawEllipse(px, py, self.cell_size, self.cell_size)
-                    else:  # Body
-                        painter.setBrush(ai.get('color', QColor(128, 128, 128, 220)))
-                        painter.setPen(Qt.NoPen)
-                        painter.drawEllipse(px, py, self.cell_size, self.cell_size)
+            self.hud.draw_score(painter, state.score)
             
-            # Draw extra food
-            painter.setBrush(QColor(255, 0, 0, 200))
-            painter.setPen(Qt.NoPen)
-            for pos in self.extra_food:
-                if pos is not None:
-                    x, y = pos
-                    painter.drawEllipse(self.offset_x + x * self.cell_size, self.offset_y + y * self.cell_size, self.cell_size, self.cell_size)
+            # Draw bodies first so the sliding heads go on top. Long snakes
+            # are drawn as one batch of pixmap fragments per sprite
+            bodies, heads, food = self._sprite_layers()
+            batched = (len(state.snake) + len(state.extra_food)
+                       + sum(len(ai) for ai in state.ai_snakes)) >= BATCH_MIN_SEGMENTS
+            if batched and visible is None:
+                draw_cells = self.body_batch.add
+            elif batched:
+                def draw_cells(sprite, cells):
+                    self.body_batch.add(sprite, filter(visible.__contains__, cells))
+            else:
+                def draw_cells(sprite, cells):
+                    # One blit per segment, skipping cells outside the repainted area
+                    for cell in cells:
+                        if visible is not None and cell not in visible:
+                            continue
+                        y, x = divmod(cell, self.grid_width)
+                        painter.drawPixmap(self.offset_x + x * self.cell_size, self.offset_y + y * self.cell_size, sprite)
+            for sprite, cells in bodies:
+                draw_cells(sprite, cells)
+            if batched:
+                self.body_batch.draw(painter)
             
-            # Draw player snake
-            for i, (x, y) in enumerate(self.snake):
-                px = self.offset_x + x * self.cell_size
-                py = self.offset_y + y * self.cell_size
-                if i == 0:  # Head
-                    if hasattr(self, 'player_head_pixmap') and self.player_head_pixmap and not self.player_head_pixmap.isNull():
-                        # Use theme image for head
-                        scaled_head = self.player_head_pixmap.scaled(self.cell_size, self.cell_size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-                        painter.drawPixmap(px, py, scaled_head)
-                    else:
-                        # Fallback to tiger-striped head with eyes
-                        painter.setBrush(QColor(255, 140, 0, 230))
-                        painter.setPen(Qt.NoPen)
-                        painter.drawEllipse(px, py, self.cell_size, self.cell_size)
-                        
-                        # Draw eyes
-                        eye_radius = self.cell_size // 6
-                        eye_offset_x = self.cell_size // 4
-                        eye_offset_y = self.cell_size // 3
-                        dx, dy = self.direction
-                        
-                        if dx == 1:  # Right
-                            ex1 = px + self.cell_size - eye_offset_x*2
-                            ex2 = px + self.cell_size - eye_offset_x*2
-                            ey1 = py + eye_offset_y
-                            ey2 = py + self.cell_size - eye_offset_y - eye_radius
-                        elif dx == -1:  # Left
-                            ex1 = px + eye_offset_x
-                            ex2 = px + eye_offset_x
-                            ey1 = py + eye_offset_y
-                            ey2 = py + self.cell_size - eye_offset_y - eye_radius
-                        elif dy == 1:  # Down
-                            ex1 = px + eye_offset_x
-                            ex2 = px + self.cell_size - eye_offset_x - eye_radius
-                            ey1 = py + self.cell_size - eye_offset_y*2
-                            ey2 = py + self.cell_size - eye_offset_y*2
-                        else:  # Up
-                            ex1 = px + eye_offset_x
-                            ex2 = px + self.cell_size - eye_offset_x - eye_radius
-                            ey1 = py + eye_offset_y
-                            ey2 = py + eye_offset_y
-                        
-                        painter.setBrush(QColor(255, 255, 255, 240))
-                        painter.drawEllipse(ex1, ey1, eye_radius, eye_radius)
-                        painter.drawEllipse(ex2, ey2, eye_radius, eye_radius)
-                        painter.setBrush(QColor(0, 0, 0, 240))
-                        painter.drawEllipse(ex1 + eye_radius//2, ey1 + eye_radius//2, eye_radius//2, eye_radius//2)
-                        painter.drawEllipse(ex2 + eye_radius//2, ey2 + eye_radius//2, eye_radius//2, eye_radius//2)
-                else:  # Body
-                    if hasattr(self, 'player_body_pixmap') and self.player_body_pixmap and not self.player_body_pixmap.isNull():
-                        # Use theme image for body
-                        scaled_body = self.player_body_pixmap.scaled(self.cell_size, self.cell_size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-                        painter.drawPixmap(px, py, scaled_body)
-                    else:
-                        # Fallback to tiger-striped body
-                        painter.setBrush(QColor(255, 140, 0, 200))
-                        painter.setPen(Qt.NoPen)
-                        painter.drawEllipse(px, py, self.cell_size, self.cell_size)
-                        if i % 2 == 0:
-                            painter.setBrush(QColor(0, 0, 0, 180))
-                            stripe_width = self.cell_size // 4
-                            painter.drawRect(px + self.cell_size//2 - stripe_width//2, py, stripe_width, self.cell_size)
+            # Draw heads, blended over the bodies they slide across
+            painter.setCompositionMode(QPainter.CompositionMode_SourceOver)
+            for sprite, px, py in heads:
+                if clip_left < px <= clip_right and clip_top < py <= clip_bottom:
+                    painter.drawPixmap(px, py, sprite)
+            painter.setCompositionMode(QPainter.CompositionMode_Source)
             
             # Draw food
-            if hasattr(self, 'food') and self.food is not None:
-                fx, fy = self.food
-                if hasattr(self, 'food_pixmap_scaled') and self.food_pixmap_scaled and not self.food_pixmap_scaled.isNull():
-                    painter.drawPixmap(self.offset_x + fx * self.cell_size, self.offset_y + fy * self.cell_size, self.food_pixmap_scaled)
-                else:
-                    painter.setBrush(QColor(255, 0, 0, 200))
-                    painter.drawEllipse(self.offset_x + fx * self.cell_size, self.offset_y + fy * self.cell_size, self.cell_size, self.cell_size)
+            if food is not None:
+                sprite, px, py = food
+                painter.drawPixmap(px, py, sprite)
             
             # Draw high scores
-            painter.setFont(QFont('Arial', 16))
-            for i, hs in enumerate(getattr(self, 'high_scores', [])[:5]):
-                painter.drawText(self.offset_x + self.grid_width * self.cell_size + 20, self.offset_y + 30 + i * 25, f'#{i+1}: {hs}')
+            self.hud.draw_high_scores(painter, getattr(self, 'high_scores', []), *self._high_scores_pos())
+            
+            if self.profiler.enabled:
+                self.hud.draw_panel(painter, self.profiler_rect, self._profiler_lines())
             
             # Draw pause/game over
-            if getattr(self, 'paused', False):
-                painter.setPen(QColor(255, 255, 255, 200))
-                painter.setFont(QFont('Arial', 48, QFont.Bold))
-                painter.drawText(self.rect(), Qt.AlignCenter, 'PAUSED')
-                
-                # Draw theme switching instructions
-                painter.setFont(QFont('Arial', 24))
-                painter.drawText(self.rect(), Qt.AlignCenter | Qt.AlignBottom, 'Press 1 for Gimmefy Theme (Default), 2 for Original College Theme')
-                
-                # Draw unpause instruction
-                painter.setFont(QFont('Arial', 20))
-                painter.drawText(self.rect(), Qt.AlignCenter | Qt.AlignBottom, 'Press P again to unpause')
-            if getattr(self, 'game_over', False):
-                painter.setPen(QColor(255, 0, 0, 220))
-                painter.setFont(QFont('Arial', 48, QFont.Bold))
-                top_score = max(getattr(self, 'high_scores', [self.score])) if getattr(self, 'high_scores', None) else self.score
-                painter.drawText(self.rect(), Qt.AlignCenter, f'GAME OVER\nScore: {self.score}\nTop Score: {top_score}\nPress SPACE to restart')
-        except Exception as e:
-            import traceback
-            print("Exception in paintEvent:", e)
-            traceback.print_exc()
+            self.hud.draw_overlays(painter, self.rect(), state.paused, state.game_over,
+                                   state.score, self._top_score(), self.current_theme,
+                                   'BOARD FULL' if state.board_full else 'GAME OVER')
+            
+            self.governor.record((time.perf_counter() - started) * 1000)
+            
+            # Turns taken since the last frame are on screen now
+            self._record_input_latency(self.pending_inputs)
+            self.pending_inputs = []
+        except Exception:
+            log.exception("Exception in paintEvent")
+
+    def _region_cells(self, region):
+        """Grid cells a repaint region touches, or None when it covers so much of the board that
+        checking every segment against it would cost more than drawing them all"""
+        size = self.cell_size
+        board = QRect(self.offset_x, self.offset_y, self.grid_width * size, self.grid_height * size)
+        rects = [rect.intersected(board) for rect in region.rects()]
+        if sum(rect.width() * rect.height() for rect in rects) > board.width() * board.height() * REGION_CULL_SHARE:
+            return None
+        cells = set()
+        for rect in rects:
+            if rect.isEmpty():
+                continue
+            first_col = (rect.left() - self.offset_x) // size
+            last_col = (rect.right() - self.offset_x) // size
+            for row in range((rect.top() - self.offset_y) // size, (rect.bottom() - self.offset_y) // size + 1):
+                start = row * self.grid_width
+                cells.update(range(start + first_col, start + last_col + 1))
+        return cells
+
+    def _sprite_layers(self):
+        """What the game shows and where, for paintEvent and the render thread alike
+
+        Returns (bodies, heads, food): bodies is a list of (sprite, cells)
+        drawn over each other in order, with cells a lazy iterable of packed
+        cell indices; heads a list of (sprite, x, y) blended on top; food a
+        (sprite, x, y) or None.
+        """
+        state = self.engine.state
+        quality = self.governor
+        shape = self.shapes.ellipse if quality.round_shapes else self.shapes.square
+        bodies = []
+        for ai in state.ai_snakes:
+            ai_color = self.rival_colors.get(ai.logo_file, QColor(128, 128, 128, 220))
+            bodies.append((shape(ai_color, self.cell_size), islice(ai, 1, None)))
+        
+        # Extra food
+        extra_food_sprite = shape(QColor(255, 0, 0, 200), self.cell_size)
+        bodies.append((extra_food_sprite, map(state.grid.index, state.extra_food)))
+        
+        # Player body
+        if hasattr(self, 'player_body_pixmap') and self.player_body_pixmap and not self.player_body_pixmap.isNull():
+            # Use theme image for body
+            bodies.append((self.player_body_pixmap, islice(state.snake, 1, None)))
+        elif quality.detail:
+            # Fallback to tiger-striped body, a stripe on every other segment
+            bodies.append((self.shapes.tiger_body(self.cell_size, False), islice(state.snake, 1, None, 2)))
+            bodies.append((self.shapes.tiger_body(self.cell_size, True), islice(state.snake, 2, None, 2)))
+        elif quality.round_shapes:
+            bodies.append((self.shapes.tiger_body(self.cell_size, False), islice(state.snake, 1, None)))
+        else:
+            bodies.append((shape(QColor(*TIGER_BODY_RGBA), self.cell_size), islice(state.snake, 1, None)))
+        
+        # Heads, where they are drawn between cells
+        heads = []
+        for ai in state.ai_snakes:
+            logo_pixmap = self.rival_logos.get(ai.logo_file)
+            if not logo_pixmap or logo_pixmap.isNull():
+                logo_pixmap = shape(self.rival_colors.get(ai.logo_file, QColor(128, 128, 128, 220)), self.cell_size)
+            heads.append((logo_pixmap,) + self._head_position(ai))
+        heads.append((self._player_head_sprite(state.direction),)
+                     + self._head_position(state.snake, state.direction))
+        
+        # Food
+        food = None
+        if state.food is not None:
+            fx, fy = state.food
+            if hasattr(self, 'food_pixmap_scaled') and self.food_pixmap_scaled and not self.food_pixmap_scaled.isNull():
+                food_pixmap = self.food_pixmap_scaled
+            else:
+                food_pixmap = extra_food_sprite
+            food = (food_pixmap, self.offset_x + fx * self.cell_size, self.offset_y + fy * self.cell_size)
+        return bodies, heads, food
+
+    def _head_position(self, snake, direction=None):
+        """Screen position of a head, slid back toward the cell it came from"""
+        y, x = divmod(snake.head, self.grid_width)
+        ox, oy = self._head_offset(snake, direction)
+        return self.offset_x + x * self.cell_size + ox, self.offset_y + y * self.cell_size + oy
+
+    def _player_head_sprite(self, direction):
+        """The theme's head image, or the tiger head looking along `direction`"""
+        if hasattr(self, 'player_head_pixmap') and self.player_head_pixmap and not self.player_head_pixmap.isNull():
+            # Use theme image for head
+            return self.player_head_pixmap
+        if self.governor.round_shapes:
+            # Fallback to tiger-striped head, with eyes at full quality
+            return self.shapes.tiger_head(self.cell_size, direction, self.governor.detail)
+        return self.shapes.square(QColor(*TIGER_HEAD_RGBA), self.cell_size)
+
+    def _high_scores_pos(self):
+        return self.offset_x + self.grid_width * self.cell_size + 20, self.offset_y + 30
+
+    def _top_score(self):
+        score = self.engine.state.score
+        return max(getattr(self, 'high_scores', [score])) if getattr(self, 'high_scores', None) else score
+
+    def _record_input_latency(self, stamps):
+        """Profile how long the turns pressed at `stamps` took to reach the screen"""
+        if stamps and self.profiler.enabled:
+            now = self.clock.nsecsElapsed() / 1e6
+            for stamp in stamps:
+                self.profiler.record('input_latency', now - stamp)
 
+    def update(self, *args):
+        """Schedule a repaint; with a render thread, a fresh frame is composed for it first"""
+        if self.frame_renderer is None:
+            super().update(*args)
+        elif not self.publish_timer.isActive():
+            # Every change made while handling this event goes into one snapshot
+            self.publish_timer.start()
+
+    def _publish_frame(self):
+        """Hand the render thread an immutable snapshot of everything the next frame shows"""
+        state = self.engine.state
+        bodies, heads, food = self._sprite_layers()
+        image = self._sprite_image
+        self.frame_sequence += 1
+        snapshot = FrameSnapshot(
+            sequence=self.frame_sequence,
+            size=(self.width(), self.height()),
+            device_pixel_ratio=self.devicePixelRatioF(),
+            origin=(self.offset_x, self.offset_y),
+            cell_size=self.cell_size,
+            grid_width=self.grid_width,
+            bodies=tuple((image(sprite), tuple(cells)) for sprite, cells in bodies),
+            heads=tuple((image(sprite), px, py) for sprite, px, py in heads),
+            food=(image(food[0]), food[1], food[2]) if food is not None else None,
+            score=state.score,
+            high_scores=tuple(getattr(self, 'high_scores', [])[:5]),
+            high_scores_pos=self._high_scores_pos(),
+            paused=state.paused,
+            game_over=state.game_over,
+            top_score=self._top_score(),
+            theme=self.current_theme,
+            title='BOARD FULL' if state.board_full else 'GAME OVER')
+        if self.pending_inputs:
+            self.published_inputs.append((self.frame_sequence, self.pending_inputs))
+            self.pending_inputs = []
+        self.frame_renderer.submit(snapshot)
+
+    def _sprite_image(self, pixmap):
+        """A sprite as a QImage the render thread can draw, converted once per pixmap"""
+        key = pixmap.cacheKey()
+        image = self.sprite_images.get(key)
+        if image is None:
+            if len(self.sprite_images) >= SPRITE_IMAGE_LIMIT:
+                # Sprites are only replaced on theme, cell size or pixel ratio changes
+                self.sprite_images.clear()
+            image = self.sprite_images[key] = pixmap.toImage()
+        return image
+
+    def _on_frame_ready(self, frame, sequence, compose_ms):
+        """Show the render thread's newest frame"""
+        if sequence < self.shown_sequence:
+            return
+        self.frame = frame
+        self.shown_sequence = sequence
+        self.governor.record(compose_ms)
+        if self.profiler.enabled:
+            self.profiler.record('compose', compose_ms)
+        super().update()
+
+    def _blit_frame(self, event):
+        """Paint by copying the render thread's latest frame; the GUI thread never composes one itself"""
+        try:
+            painter = QPainter(self)
+            painter.setCompositionMode(QPainter.CompositionMode_Source)
+            if self.frame is None:
+                painter.fillRect(event.rect(), Qt.transparent)
+            else:
+                painter.drawImage(0, 0, self.frame)
+            if self.profiler.enabled:
+                self.hud.draw_panel(painter, self.profiler_rect, self._profiler_lines())
+            while self.published_inputs and self.published_inputs[0][0] <= self.shown_sequence:
+                self._record_input_latency(self.published_inputs.popleft()[1])
+        except Exception:
+            log.exception("Exception in paintEvent")
+    
     def save_high_score(self):
         """Save high score"""
-        self.high_scores.append(self.score)
+        self.high_scores.append(self.engine.state.score)
         self.high_scores = sorted(self.high_scores, reverse=True)[:5]
         try:
             with open(HIGH_SCORE_FILE, 'w') as f:
@@ -648,6 +860,17 @@ class ScreenSnake(QWidget):
         except Exception:
             pass
 
+    def save_recording(self):
+        """Save the finished game for snake_replay.py"""
+        recording = self.engine.finish_recording()
+        if recording is None:
+            return
+        try:
+            recording.save(RECORDING_FILE)
+            log.info("Saved replay of seed %d to %s", recording.seed, RECORDING_FILE)
+        except OSError as e:
+            log.warning("Could not save replay: %s", e)
+
     def load_high_scores(self):
         """Load high scores"""
         try:
@@ -657,7 +880,17 @@ class ScreenSnake(QWidget):
             self.high_scores = []
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
-    window = ScreenSnake()
+    parser = argparse.ArgumentParser(description='Snake game on a transparent overlay')
+    parser.add_argument('--swarm', type=int, default=0, metavar='N',
+                        help='keep N rival snakes alive, reusing logos (needs NumPy)')
+    parser.add_argument('--seed', type=int, help='seed every game the same way, to reproduce it')
+    parser.add_argument('--render-thread', action='store_true',
+                        help='compose frames on a background thread; the window only copies them')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='log debug messages (or set SCREENSNAKE_LOG=debug|info)')
+    args, qt_args = parser.parse_known_args()
+    setup_logging(args.verbose)
+    app = QApplication(sys.argv[:1] + qt_args)
+    window = ScreenSnake(swarm_size=args.swarm, seed=args.seed, render_thread=args.render_thread)
     window.show()
     sys.exit(app.exec_()) 
\ No newline at end of file
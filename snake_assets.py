@@ -0,0 +1,287 @@
+"""Logo loading and caching for ScreenSnake"""
+import hashlib
+import json
+import logging
+import os
+import struct
+import threading
+from collections import OrderedDict
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QImage, QPainter, QPixmap
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; colors fall back to a per-pixel loop
+    np = None
+
+log = logging.getLogger(__name__)
+
+COLOR_CACHE_FILE = 'color_cache.json'
+COLOR_SAMPLE_STEP = 4  # Sample every 4th pixel in each direction
+
+# Prebuilt sprite atlas (see build_atlas.py)
+ATLAS_FILE = 'sprites.atlas'
+ATLAS_INDEX_FILE = 'sprites.atlas.json'
+ATLAS_CELL_SIZES = (25, 38, 50)  # 25px cells at 1x, 1.5x and 2x pixel ratios
+ATLAS_MAGIC = b'SSATLAS1'
+ATLAS_HEADER = struct.Struct('<8sIII')  # magic, width, height, bytes per line
+ATLAS_WIDTH = 1024
+
+class SpriteCache:
+    """Bounded LRU of logos scaled to fit a grid cell
+
+    Entries are keyed by (asset path, cell size, device pixel ratio,
+    transform mode), so food, player and rival logos share one cache and a
+    theme switch or a move to a screen with a different pixel ratio simply
+    looks up new keys. Missing files are cached as null pixmaps so they are
+    not retried on every lookup.
+
+    get() and put() must run on the GUI thread; decode() touches no cache
+    state and may run on a worker thread to prepare images for put().
+    """
+    def __init__(self, max_entries=64, atlas=None):
+        self.max_entries = max_entries
+        self.atlas = atlas
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, path, cell_size, device_pixel_ratio=1.0, transform=Qt.SmoothTransformation):
+        """Return the logo at `path` scaled to fit a cell_size square"""
+        key = (path, cell_size, device_pixel_ratio, int(transform))
+        pixmap = self._entries.get(key)
+        if pixmap is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return pixmap
+
+        self.misses += 1
+        image = self.decode(path, cell_size, device_pixel_ratio, transform)
+        return self.put(path, cell_size, device_pixel_ratio, image, transform)
+
+    def decode(self, path, cell_size, device_pixel_ratio=1.0, transform=Qt.SmoothTransformation):
+        """Load and scale a logo into a QImage without touching the cache (thread-safe)"""
+        # Scale in device pixels so logos stay sharp on high-DPI screens
+        size = round(cell_size * device_pixel_ratio)
+        if self.atlas is not None and transform == Qt.SmoothTransformation:
+            image = self.atlas.get(path, size)
+            if image is not None:
+                return image
+        image = QImage(path)
+        if image.isNull():
+            return image
+        return image.scaled(size, size, Qt.KeepAspectRatio, transform)
+
+    def put(self, path, cell_size, device_pixel_ratio, image, transform=Qt.SmoothTransformation):
+        """Cache a decoded image as the pixmap for this key and return it"""
+        pixmap = QPixmap.fromImage(image)
+        if not pixmap.isNull():
+            pixmap.setDevicePixelRatio(device_pixel_ratio)
+        key = (path, cell_size, device_pixel_ratio, int(transform))
+        self._entries[key] = pixmap
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return pixmap
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+def dominant_color(filename):
+    """Most common opaque (alpha > 200) RGB among sampled pixels, or None
+
+    Ties go to the color seen first scanning column by column.
+    """
+    image = QImage(filename)
+    if image.isNull():
+        return None
+    if np is None:
+        return _dominant_color_loop(image)
+    if image.format() != QImage.Format_ARGB32:
+        image = image.convertToFormat(QImage.Format_ARGB32)
+    # View the pixel buffer in place as 0xAARRGGBB words, one row per scanline
+    bits = image.constBits()
+    bits.setsize(image.bytesPerLine() * image.height())
+    pixels = np.frombuffer(bits, dtype=np.uint32).reshape(image.height(), image.bytesPerLine() // 4)
+    # Transpose so samples come out column by column, like the original loop
+    sampled = pixels[::COLOR_SAMPLE_STEP, :image.width():COLOR_SAMPLE_STEP].T.ravel()
+    rgb = sampled[(sampled >> 24) > 200] & 0xFFFFFF
+    if rgb.size == 0:
+        return None
+    colors, first_seen, counts = np.unique(rgb, return_index=True, return_counts=True)
+    best = counts == counts.max()
+    packed = int(colors[best][np.argmin(first_seen[best])])
+    return ((packed >> 16) & 0xFF, (packed >> 8) & 0xFF, packed & 0xFF)
+
+def _dominant_color_loop(image):
+    color_count = {}
+    for x in range(0, image.width(), COLOR_SAMPLE_STEP):
+        for y in range(0, image.height(), COLOR_SAMPLE_STEP):
+            color = image.pixelColor(x, y)
+            if color.alpha() > 200:  # Only non-transparent pixels
+                rgb = (color.red(), color.green(), color.blue())
+                color_count[rgb] = color_count.get(rgb, 0) + 1
+    if color_count:
+        return max(color_count, key=color_count.get)
+    return None
+
+class ColorCache:
+    """Dominant logo colors persisted between launches
+
+    Entries are keyed by file name and checked against the file's size and
+    mtime, falling back to a content hash when those differ (PyInstaller
+    unpacks assets to a fresh directory with new mtimes on every launch).
+    Safe to use from theme-loading worker threads.
+    """
+    def __init__(self, path=COLOR_CACHE_FILE):
+        self.path = path
+        self.dirty = False
+        self._lock = threading.Lock()
+        try:
+            with open(path, 'r') as f:
+                self._entries = json.load(f)
+        except Exception:
+            self._entries = {}
+
+    def get(self, filename):
+        """Dominant (r, g, b) of a logo, or None if it has no opaque pixels"""
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return None
+        name = os.path.basename(filename)
+        with self._lock:
+            entry = self._entries.get(name)
+        if entry and entry['size'] == st.st_size and entry['mtime'] == st.st_mtime:
+            return _color_or_none(entry['color'])
+        digest = _file_digest(filename)
+        if not entry or entry['sha1'] != digest:
+            color = dominant_color(filename)
+            entry = {'sha1': digest, 'color': list(color) if color else None}
+        entry = dict(entry, size=st.st_size, mtime=st.st_mtime)
+        with self._lock:
+            self._entries[name] = entry
+            self.dirty = True
+        return _color_or_none(entry['color'])
+
+    def save(self):
+        with self._lock:
+            if not self.dirty:
+                return
+            try:
+                with open(self.path, 'w') as f:
+                    json.dump(self._entries, f, indent=1)
+                self.dirty = False
+            except Exception:
+                pass
+
+def _color_or_none(color):
+    return tuple(color) if color else None
+
+def _file_digest(filename):
+    with open(filename, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def build_atlas(asset_paths, atlas_path=ATLAS_FILE, index_path=ATLAS_INDEX_FILE,
+                cell_sizes=ATLAS_CELL_SIZES):
+    """Pack every asset, pre-scaled to each cell size, into one raw ARGB32 atlas
+
+    Sprites are laid out on shelves across a fixed-width sheet. The index
+    maps each asset's file name to its source size (to spot stale entries)
+    and its [x, y, w, h] rectangle per cell size. Returns the number of
+    sprites packed.
+    """
+    sprites = []
+    for path in asset_paths:
+        image = QImage(path)
+        if image.isNull():
+            log.warning("Could not load %s for the sprite atlas", path)
+            continue
+        for size in cell_sizes:
+            scaled = image.scaled(size, size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            sprites.append((path, size, scaled.convertToFormat(QImage.Format_ARGB32_Premultiplied)))
+
+    # Shelf packing: fill each row left to right, start a new one when full
+    placements = []
+    x = y = shelf_height = 0
+    for path, size, image in sprites:
+        if x + image.width() > ATLAS_WIDTH:
+            x, y, shelf_height = 0, y + shelf_height, 0
+        placements.append((path, size, image, x, y))
+        x += image.width()
+        shelf_height = max(shelf_height, image.height())
+    height = max(1, y + shelf_height)
+
+    sheet = QImage(ATLAS_WIDTH, height, QImage.Format_ARGB32_Premultiplied)
+    sheet.fill(Qt.transparent)
+    painter = QPainter(sheet)
+    painter.setCompositionMode(QPainter.CompositionMode_Source)
+    index = {}
+    for path, size, image, x, y in placements:
+        painter.drawImage(x, y, image)
+        entry = index.setdefault(os.path.basename(path), {'bytes': os.path.getsize(path), 'cells': {}})
+        entry['cells'][str(size)] = [x, y, image.width(), image.height()]
+    painter.end()
+
+    bits = sheet.constBits()
+    bits.setsize(sheet.bytesPerLine() * sheet.height())
+    with open(atlas_path, 'wb') as f:
+        f.write(ATLAS_HEADER.pack(ATLAS_MAGIC, sheet.width(), sheet.height(), sheet.bytesPerLine()))
+        f.write(bits.asstring())
+    with open(index_path, 'w') as f:
+        json.dump({'version': 1, 'sprites': index}, f, separators=(',', ':'))
+    return len(placements)
+
+class SpriteAtlas:
+    """Read-only view of a prebuilt atlas; slices pre-scaled sprite images out of one sheet
+
+    The pixel data is read with a single read() and wrapped in a QImage
+    without decoding. Use load() to get None instead of an exception when
+    no atlas has been built.
+    """
+    def __init__(self, atlas_path, index_path):
+        with open(index_path, 'r') as f:
+            self._index = json.load(f)['sprites']
+        with open(atlas_path, 'rb') as f:
+            magic, width, height, bytes_per_line = ATLAS_HEADER.unpack(f.read(ATLAS_HEADER.size))
+            if magic != ATLAS_MAGIC:
+                raise ValueError(f'{atlas_path} is not a sprite atlas')
+            # The QImage borrows this buffer, so keep it alive alongside it
+            self._data = f.read()
+        self._sheet = QImage(self._data, width, height, bytes_per_line, QImage.Format_ARGB32_Premultiplied)
+        self._stale = set()
+
+    @classmethod
+    def load(cls, atlas_path, index_path):
+        try:
+            return cls(atlas_path, index_path)
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def get(self, path, device_size):
+        """QImage of `path` pre-scaled to device_size, or None if the atlas lacks it"""
+        name = os.path.basename(path)
+        entry = self._index.get(name)
+        if entry is None or name in self._stale:
+            return None
+        rect = entry['cells'].get(str(device_size))
+        if rect is None:
+            return None
+        # A source that changed size since the atlas was built means it is out of date
+        try:
+            if os.path.getsize(path) != entry['bytes']:
+                self._stale.add(name)
+                return None
+        except OSError:
+            pass
+        return self._sheet.copy(*rect)
@@ -0,0 +1,1011 @@
+"""Qt-free game rules for ScreenSnake
+
+Everything that decides what happens on a tick lives here so the game can be
+stepped without a display, a QApplication or a QTimer. screen_snake.py is
+the view/controller on top of it.
+"""
+import hashlib
+import heapq
+import logging
+import random
+from array import array
+from collections import deque
+from itertools import chain, islice
+
+from snake_recording import EVENT_PAUSE, EVENT_RESUME, EVENT_RIVALS, EVENT_STEER, SETTINGS, Recording
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; swarm mode then moves rivals one by one
+    np = None
+
+log = logging.getLogger(__name__)
+
+SPEED = 100     # Base milliseconds per move
+INPUT_QUEUE_SIZE = 3  # Turns that can wait for upcoming ticks; more are dropped
+SECOND_MS = 1000  # Game-time milliseconds in a second of play
+
+# Named game-time events (see EventScheduler)
+TIMED_SECOND = 'second'  # One second of play has passed
+TIMED_SPAWN = 'spawn'  # Time for another rival
+
+# Moves in the order the AI considers them: up, down, left, right
+MOVES = [(0, -1), (0, 1), (-1, 0), (1, 0)]
+
+# Occupancy grid owners
+EMPTY_CELL = 0
+PLAYER_OWNER = 1
+FIRST_AI_OWNER = 2
+
+# Items lying on a cell, kept apart from the owners so snakes can move onto them
+NO_ITEM = 0
+ITEM_FOOD = 1
+ITEM_EXTRA_FOOD = 2
+
+# Why a rival died, counted in GameState.ai_deaths
+AI_DEATH_TRAPPED = 'trapped'      # No free cell to move to
+AI_DEATH_HESITATED = 'hesitated'  # Reaction delay kept it still next to the player
+AI_DEATH_BLOCKED = 'blocked'      # Other swarm rivals took every free cell it could move to
+
+# AI movement modes
+AI_GREEDY = 'greedy'  # Step toward the food by straight-line distance
+AI_FLOOD = 'flood'    # Follow a shared flood fill from the food around obstacles
+# Cells the flood fill may expand per tick; about 2 ms of work either way
+AI_FILL_BUDGET = 20000 if np is not None else 4000
+
+UNREACHABLE = 0xFFFFFFFF
+BLOCKED = UNREACHABLE - 1  # Occupied cells while a NumPy fill is under way
+
+if np is not None:
+    MOVE_DX = np.array([dx for dx, dy in MOVES])
+    MOVE_DY = np.array([dy for dx, dy in MOVES])
+
+class OccupancyGrid:
+    """Flat per-cell owner table shared by all collision checks
+
+    It also tracks which cells hold food or extra food, and keeps an index
+    of open cells (no snake and no food) as a dense array plus each cell's
+    slot in it, so a uniformly random open cell can be picked in O(1).
+    Closing a cell swaps the last open cell into its slot.
+    """
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.clear()
+
+    def index(self, pos):
+        """Pack an (x, y) grid position into a flat cell index"""
+        return pos[1] * self.width + pos[0]
+
+    def position(self, index):
+        """Unpack a flat cell index into an (x, y) grid position"""
+        y, x = divmod(index, self.width)
+        return (x, y)
+
+    def clear(self):
+        size = self.width * self.height
+        self.cells = array('H', bytes(2 * size))
+        self.items = bytearray(size)
+        self._open = array('I', range(size))
+        self._slots = array('I', range(size))
+
+    def open_count(self):
+        return len(self._open)
+
+    def random_open_cell(self, rng):
+        """A uniformly random cell with no snake and no food, or None if there is none"""
+        if not self._open:
+            return None
+        return self._open[rng.randrange(len(self._open))]
+
+    def place_item(self, index, item):
+        if self.cells[index] == EMPTY_CELL and self.items[index] == NO_ITEM:
+            self._close(index)
+        self.items[index] = item
+
+    def remove_item(self, index):
+        if self.items[index] != NO_ITEM:
+            self.items[index] = NO_ITEM
+            if self.cells[index] == EMPTY_CELL:
+                self._reopen(index)
+
+    def _close(self, index):
+        slot = self._slots[index]
+        last = self._open.pop()
+        if last != index:
+            self._open[slot] = last
+            self._slots[last] = slot
+
+    def _reopen(self, index):
+        self._slots[index] = len(self._open)
+        self._open.append(index)
+
+    def owner_at(self, index):
+        return self.cells[index]
+
+    def is_free(self, index):
+        return self.cells[index] == EMPTY_CELL
+
+    def occupy(self, index, owner):
+        if self.cells[index] == EMPTY_CELL and self.items[index] == NO_ITEM:
+            self._close(index)
+        self.cells[index] = owner
+
+    def vacate(self, index, owner):
+        """Free a cell, but only if it still belongs to the given owner"""
+        if self.cells[index] == owner:
+            self.cells[index] = EMPTY_CELL
+            if self.items[index] == NO_ITEM:
+                self._reopen(index)
+
+class Snake:
+    """Snake body kept as a ring buffer of packed y * grid_width + x cell indices
+
+    Pushing a head and popping a tail are O(1); the buffer doubles in place
+    when a growing snake fills it.
+    """
+    __slots__ = ('grid_width', 'owner', 'direction', 'logo_file',
+                 '_cells', '_head', '_length')
+
+    def __init__(self, grid_width, start, owner, capacity=16):
+        self.grid_width = grid_width
+        self.owner = owner
+        self.direction = (1, 0)
+        self.logo_file = None
+        self._cells = array('I', bytes(4 * capacity))
+        self._head = 0
+        self._length = 0
+        self.push_head(start)
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, i):
+        """Cell index of the i-th segment counting from the head"""
+        if not 0 <= i < self._length:
+            raise IndexError('snake segment out of range')
+        return self._cells[(self._head + i) % len(self._cells)]
+
+    def __iter__(self):
+        """Iterate packed cell indices from head to tail without copying"""
+        view = memoryview(self._cells)
+        end = self._head + self._length
+        if end <= len(view):
+            return iter(view[self._head:end])
+        return chain(view[self._head:], view[:end - len(view)])
+
+    @property
+    def head(self):
+        return self._cells[self._head]
+
+    @property
+    def tail(self):
+        return self._cells[(self._head + self._length - 1) % len(self._cells)]
+
+    def positions(self):
+        """Iterate (x, y) positions from head to tail"""
+        width = self.grid_width
+        for cell in self:
+            y, x = divmod(cell, width)
+            yield (x, y)
+
+    def push_head(self, cell):
+        if self._length == len(self._cells):
+            self._grow()
+        self._head = (self._head - 1) % len(self._cells)
+        self._cells[self._head] = cell
+        self._length += 1
+
+    def pop_tail(self):
+        """Drop the tail segment and return its cell index"""
+        self._length -= 1
+        return self._cells[(self._head + self._length) % len(self._cells)]
+
+    def _grow(self):
+        # Unroll head-to-tail into the front of a buffer twice the size
+        cells = array('I', self)
+        cells.frombytes(bytes(4 * len(cells)))
+        self._cells = cells
+        self._head = 0
+
+class FoodDistanceField:
+    """Shortest wrapped-grid path length from the food to every free cell
+
+    One breadth-first flood fill is shared by all AI snakes, so the smarter
+    AI costs about the same however many rivals are alive. Occupied cells
+    and cells walled off from the food are UNREACHABLE. Each tick a fill
+    may expand a budget of cells; on boards too big for one tick it carries
+    on where it stopped next tick. A fill routes around the cells occupied
+    when it started, with or without NumPy, and budgets count cells rather
+    than time, so games replay exactly on any machine.
+    """
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        size = width * height
+        self.distances = array('I', [UNREACHABLE]) * size  # The last finished field
+        self._filling = array('I', self.distances)  # The fill in progress
+        self._unreached = array('I', self.distances)
+        self._neighbors = self._build_neighbors()
+        self._slots = np.empty(size, dtype=np.intp) if np is not None else None
+        self._start_cells = None  # Grid owners when the fill in progress started (without NumPy)
+        self.source = None  # Food cell of the last finished field
+        self.ready = False  # A finished field exists
+        self.fresh = False  # ...and it was finished this tick
+        self.fill_source = None  # Food cell of the fill in progress
+        self._frontier = None  # Cells reached last ring of the fill in progress, None when idle
+        self._distance = 0
+        self._fill_ticks = 0
+        self.fills = 0
+        self.spread_fills = 0  # Fills that needed more than one tick
+        self.last_fill_ticks = 0
+
+    @property
+    def filling(self):
+        return self._frontier is not None
+
+    def clear(self):
+        """Forget every field, e.g. for a new game"""
+        self.source = self.fill_source = self._frontier = self._start_cells = None
+        self.ready = self.fresh = False
+
+    def invalidate(self):
+        """Start of a tick: the finished field is now stale, though still usable"""
+        self.fresh = False
+        if self._frontier is not None:
+            self._fill_ticks += 1
+
+    def start(self, grid, source):
+        """Begin a fill from cell `source` around the cells occupied now; advance() does the work"""
+        self._filling[:] = self._unreached
+        if np is not None:
+            filling = np.frombuffer(self._filling, dtype=np.uint32)
+            filling[np.frombuffer(grid.cells, dtype=np.uint16) != EMPTY_CELL] = BLOCKED
+            self._frontier = np.array([source], dtype=np.intp)
+        else:
+            self._start_cells = array('H', grid.cells)
+            self._frontier = [source]
+        self._filling[source] = 0
+        self.fill_source = source
+        self._distance = 0
+        self._fill_ticks = 0
+
+    def advance(self, budget):
+        """Expand the fill in progress ring by ring through empty cells until it is done or has
+        expanded `budget` cells (finishing the ring under way); returns the budget left"""
+        if np is not None:
+            budget = self._advance_arrays(budget)
+        else:
+            budget = self._advance_lists(budget)
+        if not len(self._frontier):
+            # Done: the new field replaces the old one
+            if np is not None:
+                filling = np.frombuffer(self._filling, dtype=np.uint32)
+                filling[filling == BLOCKED] = UNREACHABLE
+            self.distances, self._filling = self._filling, self.distances
+            self.source = self.fill_source
+            self._frontier = self._start_cells = None
+            self.ready = self.fresh = True
+            self.fills += 1
+            self.last_fill_ticks = self._fill_ticks + 1
+            if self._fill_ticks:
+                self.spread_fills += 1
+        return budget
+
+    def _advance_arrays(self, budget):
+        distances = np.frombuffer(self._filling, dtype=np.uint32)
+        neighbors = self._neighbors
+        slots = self._slots
+        frontier = self._frontier
+        distance = self._distance
+        while len(frontier) and budget > 0:
+            budget -= len(frontier)
+            distance += 1
+            reached = neighbors[frontier].ravel()
+            reached = reached[distances[reached] == UNREACHABLE]
+            distances[reached] = distance
+            # Drop cells reached from two sides without sorting: only one write per cell survives
+            order = np.arange(len(reached))
+            slots[reached] = order
+            frontier = reached[slots[reached] == order]
+        self._frontier = frontier
+        self._distance = distance
+        return budget
+
+    def _advance_lists(self, budget):
+        cells = self._start_cells
+        distances = self._filling
+        neighbors = self._neighbors
+        frontier = self._frontier
+        distance = self._distance
+        while frontier and budget > 0:
+            budget -= len(frontier)
+            distance += 1
+            ring = []
+            for cell in frontier:
+                for n in neighbors[cell]:
+                    if distances[n] == UNREACHABLE and cells[n] == EMPTY_CELL:
+                        distances[n] = distance
+                        ring.append(n)
+            frontier = ring
+        self._frontier = frontier
+        self._distance = distance
+        return budget
+
+    def _build_neighbors(self):
+        """Wrapped up/down/left/right cell indices of every cell, in MOVES order
+
+        A (cells, 4) array with NumPy, else a list of tuples.
+        """
+        width, height = self.width, self.height
+        if np is not None:
+            y, x = np.divmod(np.arange(width * height, dtype=np.intp), width)
+            return np.stack([((y + dy) % height) * width + (x + dx) % width for dx, dy in MOVES], axis=1)
+        return [tuple(((y + dy) % height) * width + (x + dx) % width for dx, dy in MOVES)
+                for y in range(height) for x in range(width)]
+
+    def stats(self):
+        return {
+            'fills': self.fills,
+            'spread_fills': self.spread_fills,
+            'last_fill_ticks': self.last_fill_ticks,
+        }
+
+class EventScheduler:
+    """Game-time events in a priority queue, run as the game clock reaches them
+
+    Game time is in milliseconds and only moves when a tick runs (each
+    tick lasts the current_speed it was played at), so nothing fires,
+    drifts or piles up while the game is paused or over. Events are named;
+    scheduling a name again replaces its pending event.
+    """
+    def __init__(self):
+        self.now = 0
+        self._queue = []  # (due, sequence, name, action)
+        self._pending = {}  # name -> sequence of its live queue entry
+        self._sequence = 0  # Equal due times run in the order they were scheduled
+
+    def clear(self):
+        self.now = 0
+        self._queue = []
+        self._pending = {}
+
+    def schedule(self, name, delay, action):
+        """Call action() once `delay` ms of game time from now, replacing any pending `name` event"""
+        self._sequence += 1
+        self._pending[name] = self._sequence
+        heapq.heappush(self._queue, (self.now + delay, self._sequence, name, action))
+
+    def cancel(self, name):
+        """Drop the pending `name` event, if any"""
+        self._pending.pop(name, None)
+
+    def advance(self, ms):
+        """Move the clock on by `ms`, running every event that falls due on the way in order"""
+        until = self.now + ms
+        queue = self._queue
+        while queue and queue[0][0] <= until:
+            due, sequence, name, action = heapq.heappop(queue)
+            if self._pending.get(name) != sequence:
+                continue  # Replaced or cancelled
+            del self._pending[name]
+            # Periodic events reschedule themselves from their due time, not from `until`
+            self.now = due
+            action()
+        self.now = until
+
+class GameState:
+    """Everything that describes the game in progress"""
+    def __init__(self, grid_width, grid_height):
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.grid = OccupancyGrid(grid_width, grid_height)
+        self.snake = None
+        self.direction = (1, 0)
+        # Turns waiting for upcoming ticks, one per tick, as (direction, stamp);
+        # stamps of turns taken go to applied_inputs for latency measurement
+        self.input_queue = deque()
+        self.applied_inputs = []
+        self.dropped_inputs = 0  # Turns ignored because the queue was full
+        self.ai_snakes = []
+        self.next_ai_owner = FIRST_AI_OWNER
+        self.spawned_rival_logos = set()
+        self.elapsed_time = 0  # Seconds of play
+        self.events = EventScheduler()
+        self.ticks = 0  # Steps taken this game
+        self.score = 0
+        self.paused = False
+        self.game_over = False
+        self.food = None
+        self.extra_food = set()
+        self.board_full = False  # The game ended because no cell was left for food
+        self.ai_deaths = {}  # Rival deaths by cause (AI_DEATH_*)
+        # Cells whose contents changed since the view last asked, so it can
+        # repaint just those instead of the whole screen
+        self.changed_cells = set()
+        self.current_speed = SPEED
+        self.speed_level = 0
+        self.ai_reaction_delay = True  # AI has reaction delay initially
+
+    def digest(self):
+        """Fingerprint of the board and score, for checking that a replay matches"""
+        h = hashlib.sha1(self.grid.cells.tobytes())
+        h.update(repr((self.ticks, self.score, self.food, sorted(self.extra_food))).encode())
+        return h.hexdigest()
+
+class Engine:
+    """Game rules: player and AI movement, food, deaths, speed and rival spawning
+
+    Call step() once per game tick; timed events such as rival spawns run
+    off the game clock that the ticks advance. Rivals are identified by
+    their logo file name; what they look like is up to the caller.
+    """
+    def __init__(self, grid_width, grid_height, rival_logo_files=()):
+        # Speed management: speed_step ms faster every points_per_level points
+        self.base_speed = SPEED
+        self.speed_step = 10
+        self.points_per_level = 5
+        self.min_speed = 30
+
+        # AI difficulty management
+        self.ai_difficulty_threshold = 15  # Remove handicap after 15 points
+        self.ai_reaction_chance = 0.5  # Chance a handicapped rival stays still next to the player
+
+        self.spawn_interval = 60  # seconds
+        self.rival_logo_files = list(rival_logo_files)
+        self.state = GameState(grid_width, grid_height)
+
+        # How rivals pick moves; the flood fill expands at most ai_fill_budget
+        # cells per tick, and rivals move greedily until its first field is done
+        self.ai_mode = AI_GREEDY
+        self.ai_fill_budget = AI_FILL_BUDGET
+        self.food_field = FoodDistanceField(grid_width, grid_height)
+        self._fill_budget = 0
+
+        # Swarm mode: keep up to swarm_size rivals alive, reusing logos, and
+        # move them all in one batched NumPy step (0 = classic rivals)
+        self.swarm_size = 0
+
+        # Every game draws from its own seeded RNG; with record_games set,
+        # reset() also starts a Recording of everything that reaches the engine
+        self.seed = None
+        self.rng = random.Random()
+        self.record_games = False
+        self.recording = None
+
+    def take_changed_cells(self):
+        """Return and forget the set of cell indices changed since the last call"""
+        state = self.state
+        cells = state.changed_cells
+        state.changed_cells = set()
+        return cells
+
+    def _calculate_speed(self, score):
+        """Calculate speed based on score - faster every points_per_level points"""
+        speed_level = score // self.points_per_level
+        speed_increase = speed_level * self.speed_step
+        new_speed = max(self.min_speed, self.base_speed - speed_increase)
+        return new_speed, speed_level
+
+    def _update_speed(self):
+        """Update game speed based on current score"""
+        state = self.state
+        new_speed, new_level = self._calculate_speed(state.score)
+        if new_speed != state.current_speed:
+            state.current_speed = new_speed
+            state.speed_level = new_level
+            log.info("Speed increased! Level %d, Speed: %dms", state.speed_level, state.current_speed)
+
+        # Check if AI should become smarter
+        if state.ai_reaction_delay and state.score >= self.ai_difficulty_threshold:
+            state.ai_reaction_delay = False
+            log.info("AI snakes are now at full intelligence!")
+
+    def reset(self, seed=None):
+        """Reset the game state, seeding this game's RNG (randomly if no seed is given)"""
+        state = self.state
+        self.seed = random.getrandbits(32) if seed is None else seed
+        self.rng = random.Random(self.seed)
+        if self.record_games:
+            settings = {name: getattr(self, name) for name in SETTINGS}
+            self.recording = Recording(self.seed, state.grid_width, state.grid_height,
+                                       settings, self.rival_logo_files)
+        start = state.grid.index((state.grid_width // 2, state.grid_height // 2))
+        state.snake = Snake(state.grid_width, start, PLAYER_OWNER)
+        state.direction = (1, 0)
+        state.input_queue.clear()
+        state.applied_inputs = []
+        state.dropped_inputs = 0
+        state.ai_snakes = []
+        state.changed_cells = set()
+        state.grid.clear()
+        state.grid.occupy(start, PLAYER_OWNER)
+        self.food_field.clear()
+        state.next_ai_owner = FIRST_AI_OWNER
+        state.spawned_rival_logos = set()
+        state.elapsed_time = 0
+        state.events.clear()
+        state.events.schedule(TIMED_SECOND, SECOND_MS, self._second_event)
+        self._schedule_spawn()
+        state.ticks = 0
+        state.score = 0
+        state.paused = False
+        state.game_over = False
+        state.board_full = False
+        state.ai_deaths = {}
+        state.extra_food = set()
+
+        # Reset speed
+        state.current_speed = self.base_speed
+        state.speed_level = 0
+
+        # Reset AI difficulty
+        state.ai_reaction_delay = True
+
+        # Spawn initial AI snake
+        self._spawn_first_rival()
+        self.spawn_food()
+
+    def switch_rivals(self, rival_logo_files):
+        """Replace the rival set, e.g. after a theme change, with one fresh rival"""
+        state = self.state
+        self.rival_logo_files = list(rival_logo_files)
+        if self.recording is not None:
+            self._record(EVENT_RIVALS + self.recording.rival_set(rival_logo_files))
+        self._clear_ai_snakes()
+        state.spawned_rival_logos = set()
+        state.elapsed_time = 0
+        # The new rivals get a full spawn_interval before the next one joins
+        self._schedule_spawn()
+        self._spawn_first_rival()
+
+    def _spawn_first_rival(self):
+        if self.rival_logo_files and self.swarm_size:
+            self._spawn_swarm()
+        elif self.rival_logo_files:
+            logo_file = self.rng.choice(self.rival_logo_files)
+            self.state.spawned_rival_logos.add(logo_file)
+            start_pos = self._find_safe_spawn_position()
+            if start_pos is None:
+                return
+            ai_snake = self._add_ai_snake(start_pos, logo_file)
+            ai_snake.direction = self.rng.choice([(1, 0), (-1, 0), (0, 1), (0, -1)])
+            log.debug("Spawned AI snake with logo: %s", logo_file)
+
+    def _spawn_swarm(self):
+        """Top the swarm up to swarm_size rivals, reusing logos as often as needed"""
+        state = self.state
+        spawned = 0
+        while len(state.ai_snakes) < self.swarm_size:
+            start_pos = self._find_safe_spawn_position()
+            if start_pos is None:
+                break
+            logo_file = self.rng.choice(self.rival_logo_files)
+            state.spawned_rival_logos.add(logo_file)
+            ai_snake = self._add_ai_snake(start_pos, logo_file)
+            ai_snake.direction = self.rng.choice([(1, 0), (-1, 0), (0, 1), (0, -1)])
+            spawned += 1
+        if spawned:
+            log.debug("Spawned %d AI snakes for a swarm of %d", spawned, self.swarm_size)
+
+    def _find_safe_spawn_position(self):
+        """Random position with no snake or food to spawn an AI snake on, or None if the board is full"""
+        grid = self.state.grid
+        cell = grid.random_open_cell(self.rng)
+        if cell is None:
+            log.info("Board full - no room to spawn a rival")
+            return None
+        return grid.position(cell)
+
+    def _add_ai_snake(self, start_pos, logo_file):
+        """Create an AI snake with its own grid owner id and mark its cell occupied"""
+        state = self.state
+        start = state.grid.index(start_pos)
+        ai_snake = Snake(state.grid_width, start, state.next_ai_owner)
+        ai_snake.logo_file = logo_file
+        # Owner ids wrap around rather than overflow the grid's 16-bit cells
+        state.next_ai_owner = state.next_ai_owner + 1 if state.next_ai_owner < 0xFFFF else FIRST_AI_OWNER
+        state.grid.occupy(start, ai_snake.owner)
+        state.changed_cells.add(start)
+        state.ai_snakes.append(ai_snake)
+        return ai_snake
+
+    def _clear_ai_snakes(self):
+        """Remove every AI snake and free its cells"""
+        state = self.state
+        for ai in state.ai_snakes:
+            for cell in ai:
+                state.grid.vacate(cell, ai.owner)
+            state.changed_cells.update(ai)
+        state.ai_snakes = []
+
+    def spawn_food(self):
+        """Move the food to a random open cell; with none left the board is full and the game ends"""
+        state = self.state
+        grid = state.grid
+        if state.food is not None:
+            old_food = grid.index(state.food)
+            grid.remove_item(old_food)
+            state.changed_cells.add(old_food)
+        cell = grid.random_open_cell(self.rng)
+        if cell is None:
+            state.food = None
+            state.board_full = True
+            state.game_over = True
+            log.info("Board full - no room left for food")
+            return
+        grid.place_item(cell, ITEM_FOOD)
+        state.food = grid.position(cell)
+        state.changed_cells.add(cell)
+
+    def _drop_extra_food(self, ai):
+        """Turn a dead AI snake's body (all but its head) into extra food"""
+        state = self.state
+        grid = state.grid
+        for cell in islice(ai, 1, None):
+            if grid.items[cell] == NO_ITEM:
+                grid.place_item(cell, ITEM_EXTRA_FOOD)
+                state.extra_food.add(grid.position(cell))
+
+    def steer(self, new_dir, stamp=None):
+        """Queue a turn for an upcoming tick unless it repeats or reverses the last queued move
+
+        Each tick takes one queued turn, so quick presses (Up then Left to
+        turn a corner) are all played. `stamp` (e.g. when the key was
+        pressed) is handed back through take_applied_inputs() once the turn
+        is taken.
+        """
+        state = self.state
+        self._record(EVENT_STEER + MOVES.index(new_dir))
+        queue = state.input_queue
+        last = queue[-1][0] if queue else state.direction
+        if new_dir == last:
+            return
+        if new_dir[0] == -last[0] and new_dir[1] == -last[1] and len(state.snake) > 1:
+            return
+        if len(queue) >= INPUT_QUEUE_SIZE:
+            state.dropped_inputs += 1
+            return
+        queue.append((new_dir, stamp))
+
+    def take_applied_inputs(self):
+        """Return and forget the stamps of turns taken since the last call"""
+        state = self.state
+        stamps = state.applied_inputs
+        state.applied_inputs = []
+        return stamps
+
+    def step(self, direction=None):
+        """Advance the game by one tick, optionally steering first
+
+        Returns False without doing anything while paused or after game over.
+        """
+        state = self.state
+        if state.paused or state.game_over:
+            return False
+        if direction is not None:
+            self.steer(direction)
+        state.ticks += 1
+        tick_ms = state.current_speed
+        grid = state.grid
+        changed = state.changed_cells
+
+        # Move player snake, taking the next queued turn
+        if state.input_queue:
+            state.direction, stamp = state.input_queue.popleft()
+            if stamp is not None:
+                state.applied_inputs.append(stamp)
+        head_y, head_x = divmod(state.snake.head, state.grid_width)
+        dx, dy = state.direction
+        new_head = ((head_x + dx) % state.grid_width, (head_y + dy) % state.grid_height)
+        new_cell = grid.index(new_head)
+
+        # Check collision (the grid holds every body, tails included)
+        if not grid.is_free(new_cell):
+            state.game_over = True
+            return True
+
+        # The old head cell changes too, from head to body sprite
+        changed.add(state.snake.head)
+        changed.add(new_cell)
+        state.snake.push_head(new_cell)
+        grid.occupy(new_cell, PLAYER_OWNER)
+
+        # Check food eating
+        ate_food = False
+        if new_head == state.food:
+            state.score += 1
+            self.spawn_food()
+            ate_food = True
+            # Check if speed should increase
+            self._update_speed()
+            if state.board_full:
+                return True
+        elif new_head in state.extra_food:
+            state.score += 1
+            state.extra_food.remove(new_head)
+            grid.remove_item(new_cell)
+            ate_food = True
+            # Check if speed should increase
+            self._update_speed()
+
+        if not ate_food:
+            tail = state.snake.pop_tail()
+            grid.vacate(tail, PLAYER_OWNER)
+            changed.add(tail)
+
+        # Move AI snakes (simplified)
+        self.food_field.invalidate()
+        self._fill_budget = self.ai_fill_budget
+        dead_ai_indices = []
+        if self.swarm_size and np is not None and state.ai_snakes:
+            # Every rival picks its move from the same board, then all move
+            new_heads, moved = self._plan_ai_moves()
+            for ai, new_head in zip(state.ai_snakes, new_heads):
+                changed.add(ai.head)
+                ai.push_head(new_head)
+                grid.occupy(new_head, ai.owner)
+                changed.add(new_head)
+            # Moves only ever go to free cells, so the plan already says who
+            # bit itself by staying put and who reached the food
+            food = grid.index(state.food)
+            for idx, (ai, new_head) in enumerate(zip(state.ai_snakes, new_heads)):
+                if not moved[idx]:
+                    self._drop_extra_food(ai)
+                    dead_ai_indices.append(idx)
+                elif new_head == food:
+                    self.spawn_food()
+                else:
+                    tail = ai.pop_tail()
+                    grid.vacate(tail, ai.owner)
+                    changed.add(tail)
+        else:
+            for idx, ai in enumerate(state.ai_snakes):
+                if not ai:
+                    continue
+                changed.add(ai.head)
+                stalled = self._move_ai_snake(ai)
+                changed.add(ai.head)
+                if self._settle_ai_snake(ai):
+                    dead_ai_indices.append(idx)
+                    self._count_ai_death(stalled)
+                if state.board_full:
+                    break
+
+        # Remove dead AI snakes
+        for idx in sorted(dead_ai_indices, reverse=True):
+            log.debug("AI snake %d died", idx)
+            dead = state.ai_snakes.pop(idx)
+            for cell in dead:
+                grid.vacate(cell, dead.owner)
+            # Its body turns into extra food
+            changed.update(dead)
+
+        if dead_ai_indices and not state.ai_snakes:
+            log.debug("No AI snakes remaining. Elapsed time: %d", state.elapsed_time)
+
+        # Run the timed events this tick's worth of game time brings due
+        state.events.advance(tick_ms)
+        return True
+
+    def _settle_ai_snake(self, ai):
+        """Resolve an AI snake's new head: death, eating or moving its tail; True if it died"""
+        state = self.state
+        grid = state.grid
+        # Rivals only ever move onto free cells, so the only way to die is to
+        # stay put: the head is duplicated into the neck, which counts as biting itself
+        ai_head = ai.head
+        if ai_head == ai[1]:
+            self._drop_extra_food(ai)
+            return True
+        if grid.position(ai_head) == state.food:
+            # AI snake eats food - let it grow
+            self.spawn_food()
+        else:
+            # AI snake didn't eat food, remove tail
+            tail = ai.pop_tail()
+            grid.vacate(tail, ai.owner)
+            state.changed_cells.add(tail)
+        return False
+
+    def _plan_ai_moves(self):
+        """New head cells for every AI snake, chosen together as NumPy arrays
+
+        Same rules as _move_ai_snake, but every rival sees the board as it
+        was after the player moved. Moves are settled in rounds: rivals
+        heading for the same cell are resolved in list order, the oldest
+        getting it, and the rest try their next-best free move in the next
+        round, where they may also follow the tails the winners dragged
+        away. Rivals stay put only once they have no free move left.
+        Returns the new heads and whether each rival actually moved.
+        """
+        state = self.state
+        width, height = state.grid_width, state.grid_height
+        ais = state.ai_snakes
+        count = len(ais)
+        cells = np.frombuffer(state.grid.cells, dtype=np.uint16)
+
+        heads = np.fromiter((ai.head for ai in ais), dtype=np.int64, count=count)
+        head_y, head_x = np.divmod(heads, width)
+        nx = (head_x[:, None] + MOVE_DX) % width
+        ny = (head_y[:, None] + MOVE_DY) % height
+        candidates = ny * width + nx
+        free = cells == EMPTY_CELL
+        legal = free[candidates]
+
+        fx, fy = state.food
+        scores = np.abs(nx - fx) + np.abs(ny - fy)
+        field = self._food_distances() if self.ai_mode == AI_FLOOD else None
+        if field is not None:
+            # Path length first, straight-line distance (< width + height) breaks ties
+            distances = np.frombuffer(field.distances, dtype=np.uint32).astype(np.int64)
+            scores += distances[candidates] * (width + height)
+        moving = legal.any(axis=1)
+
+        # Reaction delay: 50% chance to not move when the player is close
+        if state.ai_reaction_delay:
+            px, py = state.grid.position(state.snake.head)
+            close = np.abs(head_x - px) + np.abs(head_y - py) <= 2
+            for i in np.flatnonzero(close & moving):
+                if self.rng.random() < self.ai_reaction_chance:
+                    moving[i] = False
+                    self._count_ai_death(AI_DEATH_HESITATED)
+
+        # Head-on conflicts: the first rival in list order wins the cell; the
+        # others look again once the winners have taken their cells
+        food = state.grid.index(state.food)
+        worst = np.iinfo(np.int64).max
+        targets = heads.copy()
+        winners = np.zeros(count, dtype=bool)
+        pending = np.flatnonzero(moving | ~legal.any(axis=1))
+        while len(pending):
+            options = candidates[pending]
+            open_options = free[options]
+            able = open_options.any(axis=1)
+            if not able.any():
+                break
+            movers = pending[able]
+            # argmin keeps the first of equal scores, matching MOVES order
+            best = np.where(open_options[able], scores[movers], worst).argmin(axis=1)
+            wanted = options[able, best]
+            _, first = np.unique(wanted, return_index=True)
+            won = movers[first]
+            winners[won] = True
+            targets[won] = wanted[first]
+            free[wanted[first]] = False
+            pending = pending[~winners[pending]]
+            if len(pending):
+                # Winners that don't eat drag their tails out of the way
+                free[[ais[i].tail for i in won[wanted[first] != food].tolist()]] = True
+        # Staying put is fatal (see _settle_ai_snake), so count why here
+        trapped = int(np.count_nonzero(~legal.any(axis=1) & ~winners))
+        if trapped:
+            self._count_ai_death(AI_DEATH_TRAPPED, trapped)
+        blocked = int(np.count_nonzero(moving & ~winners))
+        if blocked:
+            self._count_ai_death(AI_DEATH_BLOCKED, blocked)
+        return targets.tolist(), winners.tolist()
+
+    def _move_ai_snake(self, ai):
+        """Simple AI movement with reaction delay; returns why the snake stayed put, or None"""
+        if not ai:
+            return None
+        state = self.state
+        width = state.grid_width
+        stalled = None
+
+        head_y, head_x = divmod(ai.head, width)
+        fx, fy = state.food
+
+        # Check if player is very close (for reaction delay)
+        player_head = state.grid.position(state.snake.head)
+        distance_to_player = abs(head_x - player_head[0]) + abs(head_y - player_head[1])
+        player_is_close = distance_to_player <= 2  # Within 2 grid spaces
+
+        # Movement toward food, by path length when the shared field is
+        # available and straight-line distance otherwise
+        field = self._food_distances() if self.ai_mode == AI_FLOOD else None
+        possible_moves = []
+        for dx, dy in MOVES:
+            nx = (head_x + dx) % width
+            ny = (head_y + dy) % state.grid_height
+
+            cell = ny * width + nx
+            if state.grid.is_free(cell):
+                dist = abs(nx - fx) + abs(ny - fy)
+                if field is not None:
+                    # Cells cut off from the food sort after every reachable one
+                    dist = (field.distances[cell], dist)
+                possible_moves.append(((dx, dy), dist))
+
+        if possible_moves:
+            # Choose move closest to food
+            possible_moves.sort(key=lambda x: x[1])
+            dx, dy = possible_moves[0][0]
+
+            # Apply reaction delay if enabled and player is close
+            if state.ai_reaction_delay and player_is_close:
+                # ai_reaction_chance to not move when player is close (reaction delay)
+                if self.rng.random() < self.ai_reaction_chance:
+                    dx, dy = 0, 0
+                    stalled = AI_DEATH_HESITATED
+        else:
+            # No safe move, don't move
+            dx, dy = 0, 0
+            stalled = AI_DEATH_TRAPPED
+
+        new_head = state.grid.index(((head_x + dx) % width, (head_y + dy) % state.grid_height))
+        ai.push_head(new_head)
+        state.grid.occupy(new_head, ai.owner)
+        return stalled
+
+    def _count_ai_death(self, cause, count=1):
+        deaths = self.state.ai_deaths
+        deaths[cause] = deaths.get(cause, 0) + count
+
+    def _food_distances(self):
+        """The food distance field to steer by, or None (move greedily) while none leads to the current food"""
+        state = self.state
+        field = self.food_field
+        food = state.grid.index(state.food)
+        # Fill again if the food moved, even mid-tick, while this tick's budget lasts;
+        # a fill left unfinished by an earlier tick is finished first unless its food is gone
+        while self._fill_budget > 0 and not (field.fresh and field.source == food):
+            if not field.filling or field.fill_source != food:
+                field.start(state.grid, food)
+            self._fill_budget = field.advance(self._fill_budget)
+        # A field left over from food that has since moved would steer rivals
+        # to nothing; one that only predates moved bodies still routes well
+        return field if field.ready and field.source == food else None
+
+    def finish_recording(self):
+        """Close the current game's recording with its length and final state and return it"""
+        recording = self.recording
+        if recording is not None:
+            recording.ticks = self.state.ticks
+            recording.final_digest = self.state.digest()
+        return recording
+
+    def set_paused(self, paused):
+        self._record(EVENT_PAUSE if paused else EVENT_RESUME)
+        self.state.paused = paused
+
+    def _record(self, code):
+        if self.recording is not None:
+            self.recording.add(self.state.ticks, code)
+
+    def _second_event(self):
+        state = self.state
+        state.events.schedule(TIMED_SECOND, SECOND_MS, self._second_event)
+        state.elapsed_time += 1
+        # Debug: log the AI snake count every 10 seconds
+        if state.elapsed_time % 10 == 0:
+            log.debug("Time: %ds, AI snakes: %d", state.elapsed_time, len(state.ai_snakes))
+
+    def _spawn_event(self):
+        self._schedule_spawn()
+        self._spawn_rival()
+
+    def _schedule_spawn(self):
+        """Time the next rival spawn; without rival logos there is nothing to spawn"""
+        if self.rival_logo_files:
+            self.state.events.schedule(TIMED_SPAWN, self.spawn_interval * SECOND_MS, self._spawn_event)
+        else:
+            self.state.events.cancel(TIMED_SPAWN)
+
+    def _spawn_rival(self):
+        """Add the next rival, or top the swarm back up"""
+        state = self.state
+        available_logos = [f for f in self.rival_logo_files if f not in state.spawned_rival_logos]
+        if self.swarm_size and self.rival_logo_files:
+            # A swarm reuses logos, so it is refilled rather than grown
+            self._spawn_swarm()
+        elif available_logos:
+            logo_file = self.rng.choice(available_logos)
+            state.spawned_rival_logos.add(logo_file)
+            start_pos = self._find_safe_spawn_position()
+            if start_pos is not None:
+                self._add_ai_snake(start_pos, logo_file)
+                log.debug("Spawned new rival snake with logo: %s", logo_file)
+        else:
+            log.debug("No more logos available to spawn. All spawned: %s", state.spawned_rival_logos)
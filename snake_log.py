@@ -0,0 +1,89 @@
+"""Logging setup for ScreenSnake
+
+Modules log through the standard logging module (logging.getLogger(__name__)).
+setup_logging() routes every record through a queue to a listener thread,
+so a slow terminal or a missing console never blocks the game loop, and
+drops repeats of chatty messages before they are formatted or queued.
+
+The game is quiet by default (warnings and errors only). Pass --verbose or
+set SCREENSNAKE_LOG to a level name (debug, info, ...) to see more.
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+
+LOG_ENV = 'SCREENSNAKE_LOG'
+LOG_FILE = 'screen_snake.log'  # Used when there is no console (windowed PyInstaller build)
+LOG_FORMAT = '%(asctime)s %(levelname)-7s %(name)s: %(message)s'
+LOG_INTERVAL = 1.0  # Seconds over which each call site's messages are rate limited
+LOG_BURST = 5  # Messages per call site allowed through per interval
+
+class RateLimitFilter(logging.Filter):
+    """Drop repeated messages and bursts from any single logging call site
+
+    A message identical to the last one from the same call site is dropped
+    until LOG_INTERVAL has passed, and each call site may log at most
+    LOG_BURST messages per interval. The next message let through from a
+    call site reports how many were dropped in between.
+    """
+    def __init__(self, interval=LOG_INTERVAL, burst=LOG_BURST, clock=time.monotonic):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.clock = clock
+        self._sites = {}  # (logger, file, line) -> [window start, count, last message, suppressed]
+
+    def filter(self, record):
+        now = self.clock()
+        key = (record.name, record.pathname, record.lineno)
+        site = self._sites.get(key)
+        if site is None or now - site[0] >= self.interval:
+            suppressed = site[3] if site else 0
+            site = self._sites[key] = [now, 0, None, 0]
+        else:
+            suppressed = 0
+            if site[1] >= self.burst or record.getMessage() == site[2]:
+                site[3] += 1
+                return False
+        site[1] += 1
+        site[2] = record.getMessage()
+        if suppressed:
+            record.msg = f'{record.getMessage()} ({suppressed} similar messages suppressed)'
+            record.args = None
+        return True
+
+def log_level(verbose=False):
+    """Level asked for by the command line or SCREENSNAKE_LOG; WARNING by default"""
+    if verbose:
+        return logging.DEBUG
+    name = os.environ.get(LOG_ENV, '').strip().upper()
+    if name in ('1', 'ON', 'TRUE', 'VERBOSE'):
+        return logging.DEBUG
+    level = logging.getLevelName(name) if name else logging.WARNING
+    return level if isinstance(level, int) else logging.WARNING
+
+def setup_logging(verbose=False):
+    """Send all logging through a rate-limited queue to a background writer; returns the listener"""
+    if sys.stderr is not None:
+        output = logging.StreamHandler(sys.stderr)
+    else:
+        output = logging.FileHandler(LOG_FILE, delay=True)
+    output.setFormatter(logging.Formatter(LOG_FORMAT, '%H:%M:%S'))
+
+    records = queue.SimpleQueue()
+    handler = logging.handlers.QueueHandler(records)
+    handler.addFilter(RateLimitFilter())
+    root = logging.getLogger()
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(log_level(verbose))
+
+    listener = logging.handlers.QueueListener(records, output)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,159 @@
+"""Tick and frame profiler for ScreenSnake
+
+Nothing is timed until the profiler is enabled: enable() wraps the profiled
+methods on the objects passed in and disable() removes the wrappers again,
+so a disabled profiler costs nothing per tick or frame.
+"""
+import csv
+import json
+import time
+from bisect import bisect_left
+from collections import deque
+
+PROFILE_WINDOW = 600  # Samples kept per section (10 s of 60 Hz frames)
+PERCENTILES = (0.50, 0.95, 0.99)
+HISTOGRAM_BUCKETS = (1, 2, 5, 10, 20, 50)  # Upper bounds in ms; a last bucket catches the rest
+PROFILE_FILE = 'profile'  # Export basename; .json and .csv are added
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0
+    rank = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+class Profiler:
+    """Rolling timings per section plus budget overruns
+
+    Timed sections record one sample per call. Accumulated sections (for
+    example one call per AI snake) are summed and recorded as one sample
+    each time the tick section finishes.
+    """
+    def __init__(self, tick_section='game_step', window=PROFILE_WINDOW):
+        self.enabled = False
+        self.tick_section = tick_section
+        self.window = window
+        self.samples = {}
+        self.overruns = {}  # Calls that took longer than their section's budget
+        self._accumulated = {}
+        self._patched = []
+        self.started = None
+
+    def enable(self, timed=(), accumulated=()):
+        """Start timing methods on other objects
+
+        timed holds (object, method name, section, budget) tuples, where
+        budget is a callable returning the section's budget in ms, or None;
+        accumulated holds (object, method name, section) tuples.
+        """
+        if self.enabled:
+            return
+        self.enabled = True
+        self.reset()
+        for obj, name, section, budget in timed:
+            self._patch(obj, name, self._timed(getattr(obj, name), section, budget))
+        for obj, name, section in accumulated:
+            self._patch(obj, name, self._accumulating(getattr(obj, name), section))
+
+    def disable(self):
+        """Stop timing and put the original methods back"""
+        for obj, name in self._patched:
+            delattr(obj, name)
+        self._patched = []
+        self.enabled = False
+
+    def reset(self):
+        self.samples = {}
+        self.overruns = {}
+        self._accumulated = {}
+        self.started = time.time()
+
+    def _patch(self, obj, name, wrapper):
+        setattr(obj, name, wrapper)
+        self._patched.append((obj, name))
+
+    def _timed(self, func, section, budget):
+        clock = time.perf_counter
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                ms = (clock() - start) * 1000
+                self.record(section, ms)
+                if budget is not None and ms > budget():
+                    self.overruns[section] = self.overruns.get(section, 0) + 1
+                if section == self.tick_section:
+                    for name, total in self._accumulated.items():
+                        self.record(name, total)
+                    self._accumulated = {}
+        return timed
+
+    def _accumulating(self, func, section):
+        clock = time.perf_counter
+        def accumulating(*args, **kwargs):
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._accumulated[section] = self._accumulated.get(section, 0.0) + (clock() - start) * 1000
+        return accumulating
+
+    def record(self, section, ms):
+        samples = self.samples.get(section)
+        if samples is None:
+            samples = self.samples[section] = deque(maxlen=self.window)
+        samples.append(ms)
+
+    def summary(self):
+        """{section: {count, mean, p50, p95, p99, max, histogram}} in milliseconds
+
+        histogram counts samples per HISTOGRAM_BUCKETS bucket, plus one
+        bucket for anything slower.
+        """
+        result = {}
+        for section, samples in self.samples.items():
+            values = sorted(samples)
+            if not values:
+                continue
+            stats = {'count': len(values), 'mean': round(sum(values) / len(values), 3)}
+            for fraction in PERCENTILES:
+                stats[f'p{round(fraction * 100)}'] = round(percentile(values, fraction), 3)
+            stats['max'] = round(values[-1], 3)
+            stats['histogram'] = histogram = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+            for value in values:
+                histogram[bisect_left(HISTOGRAM_BUCKETS, value)] += 1
+            result[section] = stats
+        return result
+
+    def export(self, basename=PROFILE_FILE, extra=None):
+        """Write the summary to basename.json and basename.csv; returns the paths"""
+        summary = self.summary()
+        report = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'seconds': round(time.time() - self.started, 1) if self.started else 0,
+            'overruns': self.overruns,
+            'sections': summary,
+        }
+        if extra:
+            report.update(extra)
+        json_path, csv_path = basename + '.json', basename + '.csv'
+        with open(json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        with open(csv_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            columns = ['count', 'mean'] + [f'p{round(p * 100)}' for p in PERCENTILES] + ['max']
+            buckets = [f'<={bound}ms' for bound in HISTOGRAM_BUCKETS] + [f'>{HISTOGRAM_BUCKETS[-1]}ms']
+            writer.writerow(['section'] + columns + buckets)
+            for section, stats in summary.items():
+                writer.writerow([section] + [stats[c] for c in columns] + stats['histogram'])
+        return json_path, csv_path
+
+    def overlay_lines(self):
+        """Text lines describing the timings, for drawing on screen"""
+        lines = [f"{'section':<14}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>8}  ms"]
+        for section, stats in self.summary().items():
+            lines.append(f"{section:<14}{stats['p50']:>8.2f}{stats['p95']:>8.2f}{stats['p99']:>8.2f}{stats['max']:>8.2f}")
+        if self.overruns:
+            lines.append('over budget: ' + ', '.join(f'{section} {count}' for section, count in self.overruns.items()))
+        return lines
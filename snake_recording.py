@@ -0,0 +1,87 @@
+"""Compact binary recordings of ScreenSnake games
+
+A recording holds the game's RNG seed, the engine settings and every input
+that reached the engine, so snake_replay.py can re-run the game exactly.
+The file is a short JSON header followed by 5-byte (tick, code) events.
+"""
+import json
+import struct
+
+RECORDING_FILE = 'last_game.snakerec'
+RECORDING_MAGIC = b'SNAKREC1'
+RECORDING_VERSION = 1
+RECORDING_HEADER = struct.Struct('<8sI')  # magic, header JSON length
+EVENT = struct.Struct('<IB')  # ticks stepped so far, event code
+
+# Event codes
+EVENT_STEER = 0  # + index into MOVES
+EVENT_PAUSE = 4
+EVENT_RESUME = 5
+EVENT_RIVALS = 6  # + index into the recording's rival sets
+
+# Engine attributes that change how a game plays out
+SETTINGS = ('base_speed', 'speed_step', 'points_per_level', 'min_speed', 'ai_difficulty_threshold',
+            'ai_reaction_chance', 'spawn_interval', 'ai_mode', 'ai_fill_budget', 'swarm_size')
+
+class Recording:
+    """Seed, settings and input events of one game"""
+    def __init__(self, seed, grid_width, grid_height, settings, rival_logo_files):
+        self.seed = seed
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.settings = dict(settings)
+        self.rival_sets = [list(rival_logo_files)]
+        self.events = bytearray()
+        self.ticks = 0
+        self.final_digest = None
+
+    def add(self, tick, code):
+        self.events += EVENT.pack(tick, code)
+
+    def rival_set(self, rival_logo_files):
+        """Index of a rival list in this recording, adding it if it is new"""
+        rival_logo_files = list(rival_logo_files)
+        if rival_logo_files not in self.rival_sets:
+            self.rival_sets.append(rival_logo_files)
+        return self.rival_sets.index(rival_logo_files)
+
+    def __iter__(self):
+        """(tick, code) events in the order they happened"""
+        return EVENT.iter_unpack(self.events)
+
+    def __len__(self):
+        return len(self.events) // EVENT.size
+
+    def save(self, path=RECORDING_FILE):
+        header = json.dumps({
+            'version': RECORDING_VERSION,
+            'seed': self.seed,
+            'grid': [self.grid_width, self.grid_height],
+            'settings': self.settings,
+            'rival_sets': self.rival_sets,
+            'ticks': self.ticks,
+            'final_digest': self.final_digest,
+        }, separators=(',', ':')).encode()
+        with open(path, 'wb') as f:
+            f.write(RECORDING_HEADER.pack(RECORDING_MAGIC, len(header)))
+            f.write(header)
+            f.write(self.events)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            magic, header_size = RECORDING_HEADER.unpack(f.read(RECORDING_HEADER.size))
+            if magic != RECORDING_MAGIC:
+                raise ValueError(f'{path} is not a ScreenSnake recording')
+            header = json.loads(f.read(header_size))
+            if header.get('version') != RECORDING_VERSION:
+                raise ValueError(f"{path} is a format {header.get('version')} recording, "
+                                 f"this version reads format {RECORDING_VERSION}")
+            events = f.read()
+        recording = cls(header['seed'], header['grid'][0], header['grid'][1],
+                        header['settings'], header['rival_sets'][0])
+        recording.rival_sets = header['rival_sets']
+        recording.events = bytearray(events)
+        recording.ticks = header['ticks']
+        recording.final_digest = header['final_digest']
+        return recording
@@ -0,0 +1,487 @@
+"""Rendering helpers for ScreenSnake"""
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+
+from PyQt5.QtCore import Qt, QPointF, QRect, QRectF, QThread, pyqtSignal
+from PyQt5.QtGui import QPainter, QColor, QFont, QFontMetrics, QImage, QPixmap
+
+SCORE_POS = (30, 80)  # Baseline of the score text
+PAUSE_HINT = 'Press 1 for Gimmefy Theme (Default), 2 for Original College Theme'
+PANEL_COLUMNS = 56  # Characters per line of a text panel
+PANEL_PADDING = 8
+
+# Fallback tiger look, used when the theme's snake logos are missing
+TIGER_BODY_RGBA = (255, 140, 0, 200)
+TIGER_HEAD_RGBA = (255, 140, 0, 230)
+TIGER_STRIPE_RGBA = (0, 0, 0, 180)
+
+# Render quality tiers, best first (see RenderGovernor)
+QUALITY_FULL = 0  # Everything: round sprites, eyes and stripes, heads sliding between cells
+QUALITY_PLAIN = 1  # No eyes or stripes, heads jump from cell to cell, HUD panels refresh less often
+QUALITY_MINIMAL = 2  # As plain, with squares instead of round sprites
+QUALITY_NAMES = ('full', 'plain', 'minimal')
+PAINT_BUDGET_SHARE = 0.1  # Share of a tick one paint may take (10 ms at base speed, 3 ms at the fastest)
+GOVERNOR_WINDOW = 30  # Paints judged together before stepping down
+SLOW_PAINT_SHARE = 0.25  # Step down when more than this share of the window overran
+HEADROOM_SHARE = 0.4  # Paints under this share of the budget count as headroom
+HEADROOM_WINDOWS = 4  # Windows of nothing but headroom before stepping back up
+
+class HudLayer:
+    """Score, high-score table and pause/game-over overlays, pre-rendered into pixmaps
+
+    Each text item is laid out and rasterized once per distinct value and
+    blitted afterwards. Hits and rebuilds are counted so the hit rate can
+    be reported. With `images` set, layers are QImages, which unlike
+    pixmaps can be drawn off the GUI thread.
+    """
+    def __init__(self, images=False):
+        self.images = images
+        self.score_font = QFont('Arial', 28, QFont.Bold)
+        self.high_score_font = QFont('Arial', 16)
+        self.title_font = QFont('Arial', 48, QFont.Bold)
+        self.hint_font = QFont('Arial', 24)
+        self.unpause_font = QFont('Arial', 20)
+        self.panel_font = QFont('Courier', 11)
+        self.panel_font.setStyleHint(QFont.Monospace)
+        self.device_pixel_ratio = 1.0
+        self._layers = {}
+        self.hits = 0
+        self.rebuilds = 0
+
+    def set_device_pixel_ratio(self, device_pixel_ratio):
+        if device_pixel_ratio != self.device_pixel_ratio:
+            self.device_pixel_ratio = device_pixel_ratio
+            self._layers.clear()
+
+    def stats(self):
+        blits = self.hits + self.rebuilds
+        return {
+            'layers': len(self._layers),
+            'hits': self.hits,
+            'rebuilds': self.rebuilds,
+            'hit_rate': self.hits / blits if blits else 0.0,
+        }
+
+    def score_rect(self, score):
+        """Screen area covered by the score text"""
+        rect = QFontMetrics(self.score_font).boundingRect(f'Score: {score}')
+        return rect.translated(*SCORE_POS).adjusted(-2, -2, 2, 2)
+
+    def draw_score(self, painter, score):
+        text = f'Score: {score}'
+        self._blit(painter, 'score', text, lambda: self._render_text(
+            self.score_font, QColor(255, 255, 255, 240), text, self.score_rect(score),
+            baseline=SCORE_POS))
+
+    def draw_high_scores(self, painter, high_scores, x, y):
+        """Top five scores as a column starting at (x, y)"""
+        for i, hs in enumerate(high_scores[:5]):
+            text = f'#{i+1}: {hs}'
+            pos = (x, y + i * 25)
+            self._blit(painter, f'high_score_{i}', (text, pos), lambda: self._render_text(
+                self.high_score_font, QColor(255, 255, 255, 240), text,
+                QFontMetrics(self.high_score_font).boundingRect(text).translated(*pos).adjusted(-2, -2, 2, 2),
+                baseline=pos))
+
+    def draw_overlays(self, painter, area, paused, game_over, score, top_score, theme, title='GAME OVER'):
+        """PAUSED or game over text (headed by `title`) centered on `area`"""
+        if paused:
+            white = QColor(255, 255, 255, 200)
+            self._draw_aligned(painter, 'paused', (area, theme), self.title_font, white, area,
+                               Qt.AlignCenter, 'PAUSED')
+            # Draw theme switching instructions
+            self._draw_aligned(painter, 'pause_hint', (area, theme), self.hint_font, white, area,
+                               Qt.AlignCenter | Qt.AlignBottom, PAUSE_HINT)
+            # Draw unpause instruction
+            self._draw_aligned(painter, 'unpause_hint', (area, theme), self.unpause_font, white, area,
+                               Qt.AlignCenter | Qt.AlignBottom, 'Press P again to unpause')
+        if game_over:
+            text = f'{title}\nScore: {score}\nTop Score: {top_score}\nPress SPACE to restart'
+            self._draw_aligned(painter, 'game_over', (area, text), self.title_font,
+                               QColor(255, 0, 0, 220), area, Qt.AlignCenter, text)
+
+    def panel_rect(self, top_left, lines, columns=PANEL_COLUMNS):
+        """Screen area of a text panel with room for `lines` lines of `columns` characters"""
+        metrics = QFontMetrics(self.panel_font)
+        return QRect(top_left[0], top_left[1], metrics.horizontalAdvance('0') * columns + 2 * PANEL_PADDING,
+                     metrics.lineSpacing() * lines + 2 * PANEL_PADDING)
+
+    def draw_panel(self, painter, rect, lines):
+        """Lines of monospaced text on a dark backdrop; drawn directly as it changes every frame"""
+        mode = painter.compositionMode()
+        painter.setCompositionMode(QPainter.CompositionMode_SourceOver)
+        painter.fillRect(rect, QColor(0, 0, 0, 170))
+        painter.setPen(QColor(255, 255, 255, 230))
+        painter.setFont(self.panel_font)
+        metrics = QFontMetrics(self.panel_font)
+        x, y = rect.x() + PANEL_PADDING, rect.y() + PANEL_PADDING + metrics.ascent()
+        for line in lines:
+            painter.drawText(x, y, line)
+            y += metrics.lineSpacing()
+        painter.setCompositionMode(mode)
+
+    def _draw_aligned(self, painter, name, key, font, color, area, flags, text):
+        self._blit(painter, name, key, lambda: self._render_text(
+            font, color, text, QFontMetrics(font).boundingRect(area, int(flags), text).adjusted(-2, -2, 2, 2),
+            area=area, flags=flags))
+
+    def _blit(self, painter, name, key, build):
+        layer = self._layers.get(name)
+        if layer is None or layer[0] != key:
+            layer = (key,) + build()
+            self._layers[name] = layer
+            self.rebuilds += 1
+        else:
+            self.hits += 1
+        _, pixmap, top_left = layer
+        # The game paints in Source mode; blend the text layer over what is there
+        mode = painter.compositionMode()
+        painter.setCompositionMode(QPainter.CompositionMode_SourceOver)
+        if self.images:
+            painter.drawImage(top_left, pixmap)
+        else:
+            painter.drawPixmap(top_left, pixmap)
+        painter.setCompositionMode(mode)
+
+    def _render_text(self, font, color, text, rect, baseline=None, area=None, flags=0):
+        """Rasterize text into a transparent pixmap (or image) covering `rect` in screen coordinates"""
+        dpr = self.device_pixel_ratio
+        if self.images:
+            pixmap = QImage(round(rect.width() * dpr), round(rect.height() * dpr), QImage.Format_ARGB32_Premultiplied)
+        else:
+            pixmap = QPixmap(round(rect.width() * dpr), round(rect.height() * dpr))
+        pixmap.setDevicePixelRatio(dpr)
+        pixmap.fill(Qt.transparent)
+        painter = QPainter(pixmap)
+        painter.translate(-rect.x(), -rect.y())
+        painter.setPen(color)
+        painter.setFont(font)
+        if baseline is not None:
+            painter.drawText(baseline[0], baseline[1], text)
+        else:
+            painter.drawText(area, int(flags), text)
+        painter.end()
+        return pixmap, rect.topLeft()
+
+class FragmentTable(dict):
+    """One PixmapFragment per grid cell placing a sprite of one size there, built on first use"""
+    def __init__(self, origin, cell_size, grid_width, sprite):
+        super().__init__()
+        self.origin = origin
+        self.cell_size = cell_size
+        self.grid_width = grid_width
+        dpr = sprite.devicePixelRatio()
+        # Fragments are positioned by their center and sized in sprite pixels
+        self.half_width = sprite.width() / dpr / 2
+        self.half_height = sprite.height() / dpr / 2
+        self.source = QRectF(0, 0, sprite.width(), sprite.height())
+        self.scale = 1 / dpr
+
+    def __missing__(self, cell):
+        y, x = divmod(cell, self.grid_width)
+        center = QPointF(self.origin[0] + x * self.cell_size + self.half_width,
+                         self.origin[1] + y * self.cell_size + self.half_height)
+        fragment = self[cell] = QPainter.PixmapFragment.create(center, self.source, self.scale, self.scale)
+        return fragment
+
+class SpriteBatch:
+    """Collects sprites to draw on grid cells and draws each sprite with one drawPixmapFragments call
+
+    Fragments are cached per cell and sprite size, so a frame only looks
+    them up. Sprites are drawn in the order they were first added.
+    """
+    def __init__(self, origin, cell_size, grid_width):
+        self.origin = origin
+        self.cell_size = cell_size
+        self.grid_width = grid_width
+        self._tables = {}
+        self._groups = {}
+
+    def add(self, sprite, cells):
+        """Queue `sprite` at every packed cell index in `cells`"""
+        group = self._groups.get(sprite.cacheKey())
+        if group is None:
+            group = self._groups[sprite.cacheKey()] = (sprite, [])
+        key = (sprite.width(), sprite.height(), sprite.devicePixelRatio())
+        table = self._tables.get(key)
+        if table is None:
+            table = self._tables[key] = FragmentTable(self.origin, self.cell_size, self.grid_width, sprite)
+        group[1].extend(map(table.__getitem__, cells))
+
+    def draw(self, painter):
+        """Draw and forget everything queued since the last draw"""
+        for sprite, fragments in self._groups.values():
+            if fragments:
+                painter.drawPixmapFragments(fragments, sprite)
+        self._groups = {}
+
+class ShapeSprites:
+    """Procedural fallback sprites (ellipses, tiger body and head) rasterized once and blitted
+
+    Sprites are antialiased and cached per (shape, color, cell size,
+    variant), the variant being whether a body segment is striped or which
+    way a head looks. A new rival color or cell size simply gets new
+    entries; the least recently used are dropped beyond max_entries.
+    """
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self.device_pixel_ratio = 1.0
+        self._sprites = OrderedDict()
+        self.hits = 0
+        self.builds = 0
+
+    def set_device_pixel_ratio(self, device_pixel_ratio):
+        if device_pixel_ratio != self.device_pixel_ratio:
+            self.device_pixel_ratio = device_pixel_ratio
+            self._sprites.clear()
+
+    def stats(self):
+        lookups = self.hits + self.builds
+        return {
+            'entries': len(self._sprites),
+            'hits': self.hits,
+            'builds': self.builds,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def ellipse(self, color, cell_size):
+        """A cell-sized dot in `color` (rival bodies, extra food)"""
+        def paint(painter):
+            painter.setBrush(color)
+            painter.drawEllipse(0, 0, cell_size, cell_size)
+        return self._get(('ellipse', color.rgba(), cell_size, None), cell_size, paint)
+
+    def square(self, color, cell_size):
+        """A cell-sized square in `color`, the cheap stand-in for every round shape"""
+        def paint(painter):
+            painter.fillRect(0, 0, cell_size, cell_size, color)
+        return self._get(('square', color.rgba(), cell_size, None), cell_size, paint)
+
+    def tiger_body(self, cell_size, striped):
+        """An orange body segment, with a black stripe down the middle if `striped`"""
+        def paint(painter):
+            painter.setBrush(QColor(*TIGER_BODY_RGBA))
+            painter.drawEllipse(0, 0, cell_size, cell_size)
+            if striped:
+                # The stripe replaces the body color rather than blending over it
+                painter.setCompositionMode(QPainter.CompositionMode_Source)
+                painter.setBrush(QColor(*TIGER_STRIPE_RGBA))
+                stripe_width = cell_size // 4
+                painter.drawRect(cell_size // 2 - stripe_width // 2, 0, stripe_width, cell_size)
+        return self._get(('tiger_body', 0, cell_size, striped), cell_size, paint)
+
+    def tiger_head(self, cell_size, direction, eyes=True):
+        """An orange head with two eyes looking along `direction`, or a plain one without `eyes`"""
+        def paint(painter):
+            painter.setBrush(QColor(*TIGER_HEAD_RGBA))
+            painter.drawEllipse(0, 0, cell_size, cell_size)
+            if not eyes:
+                return
+            eye_radius = cell_size // 6
+            eye_offset_x = cell_size // 4
+            eye_offset_y = cell_size // 3
+            dx, dy = direction
+            if dx == 1:  # Right
+                ex1 = ex2 = cell_size - eye_offset_x * 2
+                ey1, ey2 = eye_offset_y, cell_size - eye_offset_y - eye_radius
+            elif dx == -1:  # Left
+                ex1 = ex2 = eye_offset_x
+                ey1, ey2 = eye_offset_y, cell_size - eye_offset_y - eye_radius
+            elif dy == 1:  # Down
+                ex1, ex2 = eye_offset_x, cell_size - eye_offset_x - eye_radius
+                ey1 = ey2 = cell_size - eye_offset_y * 2
+            else:  # Up
+                ex1, ex2 = eye_offset_x, cell_size - eye_offset_x - eye_radius
+                ey1 = ey2 = eye_offset_y
+            painter.setBrush(QColor(255, 255, 255, 240))
+            painter.drawEllipse(ex1, ey1, eye_radius, eye_radius)
+            painter.drawEllipse(ex2, ey2, eye_radius, eye_radius)
+            painter.setBrush(QColor(0, 0, 0, 240))
+            painter.drawEllipse(ex1 + eye_radius // 2, ey1 + eye_radius // 2, eye_radius // 2, eye_radius // 2)
+            painter.drawEllipse(ex2 + eye_radius // 2, ey2 + eye_radius // 2, eye_radius // 2, eye_radius // 2)
+        return self._get(('tiger_head', 0, cell_size, tuple(direction) if eyes else None), cell_size, paint)
+
+    def _get(self, key, cell_size, paint):
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self._sprites.move_to_end(key)
+            self.hits += 1
+            return sprite
+        self.builds += 1
+        dpr = self.device_pixel_ratio
+        sprite = QPixmap(round(cell_size * dpr), round(cell_size * dpr))
+        sprite.setDevicePixelRatio(dpr)
+        sprite.fill(Qt.transparent)
+        painter = QPainter(sprite)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(Qt.NoPen)
+        paint(painter)
+        painter.end()
+        self._sprites[key] = sprite
+        if len(self._sprites) > self.max_entries:
+            self._sprites.popitem(last=False)
+        return sprite
+
+class RenderGovernor:
+    """Picks a render quality tier from how long recent paints took against the tick budget
+
+    The budget is PAINT_BUDGET_SHARE of the tick interval, so it tightens
+    as the game speeds up, but never more than a whole frame interval. When
+    more than SLOW_PAINT_SHARE of a window of paints overran it, quality
+    steps down one tier; after HEADROOM_WINDOWS windows in which every
+    paint stayed under HEADROOM_SHARE of the budget, it steps back up.
+    """
+    def __init__(self, window=GOVERNOR_WINDOW):
+        self.tier = QUALITY_FULL
+        self.window = window
+        self.budget_ms = None
+        self._paints = deque(maxlen=window)
+        self._calm = 0  # Paints in a row with headroom to spare
+        self.changes = 0
+
+    @property
+    def name(self):
+        return QUALITY_NAMES[self.tier]
+
+    @property
+    def detail(self):
+        """Whether eyes, stripes and sliding heads are drawn"""
+        return self.tier == QUALITY_FULL
+
+    @property
+    def round_shapes(self):
+        return self.tier < QUALITY_MINIMAL
+
+    @property
+    def hud_interval_scale(self):
+        """How many times longer than normal HUD panels wait between refreshes"""
+        return 1 << self.tier
+
+    def record(self, ms):
+        """Note how long one paint took"""
+        self._paints.append(ms)
+        if self.budget_ms is not None and ms < self.budget_ms * HEADROOM_SHARE:
+            self._calm += 1
+        else:
+            self._calm = 0
+
+    def adjust(self, tick_ms, frame_ms):
+        """Update the budget and step the tier if recent paints call for it; returns whether it changed"""
+        self.budget_ms = min(tick_ms * PAINT_BUDGET_SHARE, frame_ms)
+        if len(self._paints) == self.window and self.tier < QUALITY_MINIMAL:
+            slow = sum(ms > self.budget_ms for ms in self._paints)
+            if slow > self.window * SLOW_PAINT_SHARE:
+                return self._set_tier(self.tier + 1)
+        if self._calm >= self.window * HEADROOM_WINDOWS and self.tier > QUALITY_FULL:
+            return self._set_tier(self.tier - 1)
+        return False
+
+    def _set_tier(self, tier):
+        # Judge the new tier on its own paints only
+        self.tier = tier
+        self._paints.clear()
+        self._calm = 0
+        self.changes += 1
+        return True
+
+    def stats(self):
+        paints = sorted(self._paints)
+        return {
+            'tier': self.name,
+            'budget_ms': round(self.budget_ms, 2) if self.budget_ms is not None else None,
+            'recent_max_ms': round(paints[-1], 2) if paints else None,
+            'changes': self.changes,
+        }
+
+# Everything one frame shows, copied out of the game so another thread can draw it.
+# bodies: ((sprite, cells), ...) drawn over each other in order, cells being
+# packed cell indices; heads: ((sprite, x, y), ...) blended on top; food:
+# (sprite, x, y) or None. Sprites are QImages. high_scores_pos is where the
+# high-score column starts and title heads the game-over text.
+FrameSnapshot = namedtuple('FrameSnapshot', [
+    'sequence', 'size', 'device_pixel_ratio', 'origin', 'cell_size', 'grid_width',
+    'bodies', 'heads', 'food', 'score', 'high_scores', 'high_scores_pos',
+    'paused', 'game_over', 'top_score', 'theme', 'title'])
+
+def compose_frame(painter, snapshot, hud):
+    """Draw a snapshot onto a transparent frame, in the same order as ScreenSnake.paintEvent"""
+    painter.setCompositionMode(QPainter.CompositionMode_Source)
+    hud.draw_score(painter, snapshot.score)
+    origin_x, origin_y = snapshot.origin
+    cell_size, grid_width = snapshot.cell_size, snapshot.grid_width
+    for sprite, cells in snapshot.bodies:
+        for cell in cells:
+            y, x = divmod(cell, grid_width)
+            painter.drawImage(origin_x + x * cell_size, origin_y + y * cell_size, sprite)
+    painter.setCompositionMode(QPainter.CompositionMode_SourceOver)
+    for sprite, x, y in snapshot.heads:
+        painter.drawImage(x, y, sprite)
+    painter.setCompositionMode(QPainter.CompositionMode_Source)
+    if snapshot.food is not None:
+        sprite, x, y = snapshot.food
+        painter.drawImage(x, y, sprite)
+    hud.draw_high_scores(painter, snapshot.high_scores, *snapshot.high_scores_pos)
+    hud.draw_overlays(painter, QRect(0, 0, *snapshot.size), snapshot.paused, snapshot.game_over,
+                      snapshot.score, snapshot.top_score, snapshot.theme, snapshot.title)
+
+class FrameRenderer(QThread):
+    """Composes FrameSnapshots into QImages on a background thread
+
+    submit() never blocks: a snapshot that arrives while another is being
+    drawn replaces any still waiting, so only the newest is drawn. Frames
+    alternate between two images, so the one the GUI is showing is not
+    drawn over. frame_ready hands each finished frame to the GUI thread
+    with its snapshot's sequence number and how many ms it took.
+    """
+    frame_ready = pyqtSignal(QImage, int, float)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._condition = threading.Condition()
+        self._pending = None
+        self._stopping = False
+        self._buffers = [QImage(), QImage()]
+        self._back = 0
+
+    def submit(self, snapshot):
+        with self._condition:
+            self._pending = snapshot
+            self._condition.notify()
+
+    def stop(self):
+        """Finish the frame in progress, then end the thread"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        self.wait()
+
+    def run(self):
+        # Fonts and text layers belong to the thread that draws with them
+        hud = HudLayer(images=True)
+        while True:
+            with self._condition:
+                while self._pending is None and not self._stopping:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+                snapshot, self._pending = self._pending, None
+            started = time.perf_counter()
+            frame = self._frame_buffer(snapshot)
+            hud.set_device_pixel_ratio(snapshot.device_pixel_ratio)
+            painter = QPainter(frame)
+            compose_frame(painter, snapshot, hud)
+            painter.end()
+            self.frame_ready.emit(frame, snapshot.sequence, (time.perf_counter() - started) * 1000)
+
+    def _frame_buffer(self, snapshot):
+        """The back buffer, cleared and sized for the snapshot; the buffers swap roles each frame"""
+        self._back ^= 1
+        dpr = snapshot.device_pixel_ratio
+        width, height = round(snapshot.size[0] * dpr), round(snapshot.size[1] * dpr)
+        frame = self._buffers[self._back]
+        if frame.width() != width or frame.height() != height:
+            frame = self._buffers[self._back] = QImage(width, height, QImage.Format_ARGB32_Premultiplied)
+        frame.setDevicePixelRatio(dpr)
+        frame.fill(Qt.transparent)
+        return frame
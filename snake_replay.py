@@ -0,0 +1,92 @@
+"""Headless replay of recorded ScreenSnake games
+
+Re-runs a recording (see snake_recording.py) through the Qt-free engine as
+fast as the CPU allows and checks that it ends in the same state as the
+recorded game. Handy for reproducing a slow or buggy game exactly, and as
+a repeatable profiling workload:
+
+    python snake_replay.py last_game.snakerec
+    python snake_replay.py last_game.snakerec --repeat 50
+"""
+import argparse
+import sys
+import time
+
+from snake_engine import MOVES, Engine
+from snake_log import setup_logging
+from snake_recording import EVENT_PAUSE, EVENT_RESUME, EVENT_RIVALS, RECORDING_FILE, Recording
+
+def build_engine(recording):
+    """Engine set up and reset exactly like the recorded game's"""
+    engine = Engine(recording.grid_width, recording.grid_height, recording.rival_sets[0])
+    for name, value in recording.settings.items():
+        setattr(engine, name, value)
+    engine.reset(recording.seed)
+    return engine
+
+def iter_replay(recording):
+    """Play a recording back without a display, yielding the engine after every tick"""
+    engine = build_engine(recording)
+    state = engine.state
+    step = engine.step
+    for tick, code in recording:
+        while state.ticks < tick and step():
+            yield engine
+        _apply_event(engine, recording, code)
+    while state.ticks < recording.ticks and step():
+        yield engine
+
+def replay(recording):
+    """Play a recording back without a display; returns the engine in its final state"""
+    engine = build_engine(recording)
+    state = engine.state
+    step = engine.step
+    for tick, code in recording:
+        while state.ticks < tick and step():
+            pass
+        _apply_event(engine, recording, code)
+    while state.ticks < recording.ticks and step():
+        pass
+    return engine
+
+def _apply_event(engine, recording, code):
+    if code < EVENT_PAUSE:
+        engine.steer(MOVES[code])
+    elif code == EVENT_PAUSE:
+        engine.set_paused(True)
+    elif code == EVENT_RESUME:
+        engine.set_paused(False)
+    elif code >= EVENT_RIVALS:
+        engine.switch_rivals(recording.rival_sets[code - EVENT_RIVALS])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('recording', nargs='?', default=RECORDING_FILE)
+    parser.add_argument('--repeat', type=int, default=1, help='replay this many times (for profiling)')
+    parser.add_argument('--verbose', action='store_true', help="log the engine's debug messages")
+    args = parser.parse_args(argv)
+    setup_logging(args.verbose)
+
+    recording = Recording.load(args.recording)
+    print(f"{args.recording}: seed {recording.seed}, {recording.grid_width}x{recording.grid_height}, "
+          f"{recording.ticks} ticks, {len(recording)} events")
+    elapsed = 0.0
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        engine = replay(recording)
+        elapsed += time.perf_counter() - start
+    state = engine.state
+    ticks = state.ticks * args.repeat
+    print(f"Replayed {ticks} ticks in {elapsed:.3f}s ({ticks / elapsed:.0f} ticks/s): "
+          f"score {state.score}, {len(state.ai_snakes)} rivals, game over: {state.game_over}")
+    if recording.final_digest is None:
+        print("Recording has no final state to check against")
+    elif state.digest() == recording.final_digest:
+        print("Final state matches the recorded game")
+    else:
+        print("Final state DIFFERS from the recorded game")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
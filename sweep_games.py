@@ -0,0 +1,277 @@
+"""Batch simulator for tuning ScreenSnake's difficulty
+
+Plays thousands of headless games with a scripted player bot on a
+process pool, sweeping the speed curve, when rivals lose their handicap,
+how often they spawn and how likely a handicapped rival is to hesitate.
+Every game is streamed to a JSON-lines file as it finishes, so memory stays
+flat however big the sweep; a summary table per parameter combination is
+printed at the end:
+
+    python sweep_games.py --games 200 --ai-threshold 10 15 20 --reaction-chance 0.3 0.5
+    python sweep_games.py --games 50 --speed-step 5 10 --min-speed 30 50 --output speed.jsonl
+
+Games use the same seeds in every combination, so differences between
+rows come from the parameters rather than from luck.
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from snake_engine import MOVES, PLAYER_OWNER, Engine
+
+# Swept engine attributes and the command-line flags that set them
+PARAMETERS = [
+    ('base_speed', '--base-speed', int),
+    ('speed_step', '--speed-step', int),
+    ('points_per_level', '--points-per-level', int),
+    ('min_speed', '--min-speed', int),
+    ('ai_difficulty_threshold', '--ai-threshold', int),
+    ('spawn_interval', '--spawn-interval', int),
+    ('ai_reaction_chance', '--reaction-chance', float),
+]
+RIVAL_LOGOS = [f'rival{i}' for i in range(5)]  # Same number of rivals as a theme
+LOOKAHEAD_CELLS = 64  # How much room the bot wants after a move before it counts as safe
+
+# How a game ended
+END_RIVAL = 'rival'  # The player ran into a rival
+END_SELF = 'self'  # The player ran into itself
+END_BOARD_FULL = 'board_full'
+END_TIMEOUT = 'timeout'  # Still alive after --max-seconds of game time
+ENDS = (END_RIVAL, END_SELF, END_BOARD_FULL, END_TIMEOUT)
+
+class FoodBot:
+    """Heads for the food by wrapped straight-line distance, avoiding cells that are taken
+
+    Among safe moves it prefers those leaving at least LOOKAHEAD_CELLS of
+    reachable room, so it does not crawl into pockets it cannot leave.
+    """
+    def __init__(self, engine):
+        self.engine = engine
+
+    def next_direction(self):
+        state = self.engine.state
+        grid = state.grid
+        width, height = state.grid_width, state.grid_height
+        head_x, head_y = grid.position(state.snake.head)
+        fx, fy = state.food
+        candidates = []
+        for dx, dy in MOVES:
+            if (dx, dy) == (-state.direction[0], -state.direction[1]):
+                continue
+            nx, ny = (head_x + dx) % width, (head_y + dy) % height
+            cell = grid.index((nx, ny))
+            if grid.is_free(cell):
+                distance = min(abs(nx - fx), width - abs(nx - fx)) + min(abs(ny - fy), height - abs(ny - fy))
+                candidates.append((distance, cell, (dx, dy)))
+        if not candidates:
+            # Trapped: keep going and let the engine end the game
+            return state.direction
+        # Closest move with enough room, else the one with the most room
+        candidates.sort()
+        roomiest = None
+        for distance, cell, direction in candidates:
+            room = self._room(cell)
+            if room >= LOOKAHEAD_CELLS:
+                return direction
+            if roomiest is None or room > roomiest[0]:
+                roomiest = (room, direction)
+        return roomiest[1]
+
+    def _room(self, start):
+        """Free cells reachable from `start`, counting up to LOOKAHEAD_CELLS"""
+        state = self.engine.state
+        grid = state.grid
+        width, height = state.grid_width, state.grid_height
+        seen = {start}
+        queue = deque([start])
+        while queue and len(seen) < LOOKAHEAD_CELLS:
+            y, x = divmod(queue.popleft(), width)
+            for neighbor in (((y - 1) % height) * width + x, ((y + 1) % height) * width + x,
+                             y * width + (x - 1) % width, y * width + (x + 1) % width):
+                if neighbor not in seen and grid.is_free(neighbor):
+                    seen.add(neighbor)
+                    queue.append(neighbor)
+        return len(seen)
+
+def play_game(job):
+    """Play one game with the bot; runs in a worker process and returns a JSON-ready result"""
+    params, seed, grid_width, grid_height, max_seconds = job
+    engine = Engine(grid_width, grid_height, RIVAL_LOGOS)
+    for name, value in params.items():
+        setattr(engine, name, value)
+    engine.reset(seed)
+    state = engine.state
+    bot = FoodBot(engine)
+    # Game time comes from the engine's clock: every tick lasts current_speed ms
+    end = END_TIMEOUT
+    while state.events.now < max_seconds * 1000:
+        direction = bot.next_direction()
+        head_x, head_y = state.grid.position(state.snake.head)
+        target = state.grid.index(((head_x + direction[0]) % grid_width, (head_y + direction[1]) % grid_height))
+        target_owner = state.grid.owner_at(target)
+        engine.step(direction)
+        if state.game_over:
+            if state.board_full:
+                end = END_BOARD_FULL
+            else:
+                end = END_SELF if target_owner == PLAYER_OWNER else END_RIVAL
+            break
+    return {
+        'params': params,
+        'seed': seed,
+        'end': end,
+        'score': state.score,
+        'survival_s': round(state.events.now / 1000, 2),
+        'ticks': state.ticks,
+        'speed_level': state.speed_level,
+        'rivals_alive': len(state.ai_snakes),
+        'rivals_spawned': len(state.spawned_rival_logos),
+        'ai_deaths': state.ai_deaths,
+    }
+
+class Summary:
+    """Running totals for one parameter combination, kept as histograms so memory stays flat"""
+    def __init__(self):
+        self.games = 0
+        self.survival = {}  # Whole seconds -> games
+        self.scores = {}
+        self.ends = dict.fromkeys(ENDS, 0)
+        self.ai_deaths = {}
+
+    def add(self, result):
+        self.games += 1
+        seconds = int(result['survival_s'])
+        self.survival[seconds] = self.survival.get(seconds, 0) + 1
+        self.scores[result['score']] = self.scores.get(result['score'], 0) + 1
+        self.ends[result['end']] += 1
+        for cause, count in result['ai_deaths'].items():
+            self.ai_deaths[cause] = self.ai_deaths.get(cause, 0) + count
+
+    def stats(self):
+        return {
+            'games': self.games,
+            'survival_mean_s': round(_mean(self.survival), 1),
+            'survival_p50_s': _percentile(self.survival, 0.50),
+            'survival_p90_s': _percentile(self.survival, 0.90),
+            'score_mean': round(_mean(self.scores), 2),
+            'score_p50': _percentile(self.scores, 0.50),
+            'score_p90': _percentile(self.scores, 0.90),
+            'score_max': max(self.scores),
+            'ends': self.ends,
+            'ai_deaths_per_game': {cause: round(count / self.games, 2)
+                                   for cause, count in sorted(self.ai_deaths.items())},
+        }
+
+def _mean(histogram):
+    return sum(value * count for value, count in histogram.items()) / sum(histogram.values())
+
+def _percentile(histogram, fraction):
+    """Nearest-rank percentile of a {value: count} histogram"""
+    total = sum(histogram.values())
+    rank = min(total, max(1, round(fraction * total)))
+    seen = 0
+    for value in sorted(histogram):
+        seen += histogram[value]
+        if seen >= rank:
+            return value
+
+def combinations(args):
+    """Every combination of the swept parameter values, as {engine attribute: value}"""
+    names = [name for name, _, _ in PARAMETERS]
+    values = [getattr(args, name) for name in names]
+    return [dict(zip(names, combo)) for combo in itertools.product(*values)]
+
+def jobs(args, combos):
+    for params in combos:
+        for game in range(args.games):
+            yield params, args.seed + game, args.grid[0], args.grid[1], args.max_seconds
+
+def run_sweep(args, combos, summaries, output):
+    """Run every game on the pool, writing results as they finish with at most a few games queued per worker"""
+    pending = set()
+    done_games = 0
+    total = len(combos) * args.games
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for job in jobs(args, combos):
+            pending.add(pool.submit(play_game, job))
+            if len(pending) >= args.workers * 4:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                done_games += _collect(finished, summaries, output)
+                _progress(done_games, total, started)
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            done_games += _collect(finished, summaries, output)
+            _progress(done_games, total, started)
+    print(file=sys.stderr)
+
+def _collect(finished, summaries, output):
+    for future in finished:
+        result = future.result()
+        output.write(json.dumps(result, separators=(',', ':')) + '\n')
+        summaries[_combo_key(result['params'])].add(result)
+    return len(finished)
+
+def _progress(done, total, started):
+    if done % max(1, total // 100) and done != total:
+        return
+    elapsed = time.perf_counter() - started
+    print(f"\r{done}/{total} games, {done / elapsed:.0f} games/s", end='', file=sys.stderr)
+
+def _combo_key(params):
+    return tuple(params[name] for name, _, _ in PARAMETERS)
+
+def print_table(combos, summaries):
+    swept = [(name, flag) for name, flag, _ in PARAMETERS if len({params[name] for params in combos}) > 1]
+    headers = [flag.lstrip('-') for _, flag in swept] + [
+        'games', 'surv mean', 'p50', 'p90', 'score mean', 'p50', 'p90', 'max',
+        'end rival/self/full/time', 'rival deaths/game']
+    rows = []
+    for params in combos:
+        stats = summaries[_combo_key(params)].stats()
+        deaths = ' '.join(f'{cause} {count}' for cause, count in stats['ai_deaths_per_game'].items()) or '-'
+        rows.append([str(params[name]) for name, _ in swept] + [
+            str(stats['games']), f"{stats['survival_mean_s']}s", f"{stats['survival_p50_s']}s",
+            f"{stats['survival_p90_s']}s", str(stats['score_mean']), str(stats['score_p50']),
+            str(stats['score_p90']), str(stats['score_max']),
+            '/'.join(str(stats['ends'][end]) for end in ENDS), deaths])
+    widths = [max(len(row[i]) for row in rows + [headers]) for i in range(len(headers))]
+    for row in [headers] + rows:
+        print('  '.join(cell.rjust(width) for cell, width in zip(row, widths)))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    engine = Engine(1, 1)
+    for name, flag, kind in PARAMETERS:
+        default = getattr(engine, name)
+        parser.add_argument(flag, dest=name, type=kind, nargs='+', default=[default], metavar='V',
+                            help=f'{name} values to sweep (default {default})')
+    parser.add_argument('--games', type=int, default=100, help='games per parameter combination')
+    parser.add_argument('--grid', type=lambda text: tuple(int(v) for v in text.split('x')), default=(76, 43),
+                        metavar='WxH', help='grid size in cells (default 76x43, a 1080p screen)')
+    parser.add_argument('--max-seconds', type=int, default=600, help='game time after which a game is stopped')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes (default: all cores)')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the first game in every combination')
+    parser.add_argument('--output', default='sweep_games.jsonl', help='per-game results, one JSON object per line')
+    parser.add_argument('--summary', help='also write the summary table as JSON to this file')
+    args = parser.parse_args()
+
+    combos = combinations(args)
+    summaries = {_combo_key(params): Summary() for params in combos}
+    print(f"{len(combos)} combinations x {args.games} games on {args.workers} workers", file=sys.stderr)
+    with open(args.output, 'w') as output:
+        run_sweep(args, combos, summaries, output)
+    print_table(combos, summaries)
+    if args.summary:
+        with open(args.summary, 'w') as f:
+            json.dump([dict(params=params, **summaries[_combo_key(params)].stats()) for params in combos],
+                      f, indent=2)
+    print(f"Wrote per-game results to {args.output}")
+
+if __name__ == '__main__':
+    main()
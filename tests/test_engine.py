@@ -0,0 +1,424 @@
+"""Tests for the headless game engine (snake_engine.py)"""
+import random
+
+import pytest
+
+import snake_engine
+from snake_engine import (AI_DEATH_BLOCKED, AI_FLOOD, EMPTY_CELL, FIRST_AI_OWNER, INPUT_QUEUE_SIZE,
+                          ITEM_FOOD, MOVES, NO_ITEM, PLAYER_OWNER, UNREACHABLE, Engine,
+                          EventScheduler, FoodDistanceField, OccupancyGrid, Snake)
+from snake_recording import Recording
+from snake_replay import replay
+
+RIVALS = ['a.png', 'b.png', 'c.png']
+UP, DOWN, LEFT, RIGHT = MOVES
+WHOLE_FILL = 10 ** 9  # A fill budget no test board can use up
+
+def open_cells(grid):
+    return {i for i in range(grid.width * grid.height)
+            if grid.cells[i] == EMPTY_CELL and grid.items[i] == NO_ITEM}
+
+def test_grid_open_index_tracks_snakes_and_items():
+    grid = OccupancyGrid(7, 5)
+    rng = random.Random(3)
+    size = grid.width * grid.height
+    for _ in range(2000):
+        cell = rng.randrange(size)
+        action = rng.randrange(4)
+        if action == 0:
+            grid.occupy(cell, rng.choice([PLAYER_OWNER, FIRST_AI_OWNER]))
+        elif action == 1 and grid.owner_at(cell) != EMPTY_CELL:
+            grid.vacate(cell, grid.owner_at(cell))
+        elif action == 2:
+            grid.place_item(cell, ITEM_FOOD)
+        else:
+            grid.remove_item(cell)
+        expected = open_cells(grid)
+        assert set(grid._open) == expected
+        assert grid.open_count() == len(expected)
+        assert all(grid._open[grid._slots[i]] == i for i in expected)
+
+def test_grid_vacate_keeps_cells_taken_over_by_another_owner():
+    grid = OccupancyGrid(4, 4)
+    grid.occupy(5, FIRST_AI_OWNER)
+    grid.occupy(5, PLAYER_OWNER)
+    grid.vacate(5, FIRST_AI_OWNER)
+    assert grid.owner_at(5) == PLAYER_OWNER
+    assert 5 not in open_cells(grid)
+
+def test_grid_random_open_cell():
+    grid = OccupancyGrid(3, 3)
+    for cell in range(9):
+        if cell != 4:
+            grid.occupy(cell, PLAYER_OWNER)
+    assert grid.random_open_cell(random.Random(0)) == 4
+    grid.place_item(4, ITEM_FOOD)
+    assert grid.random_open_cell(random.Random(0)) is None
+
+def fill_board(engine, keep_open=()):
+    """Cover every cell but `keep_open` with player body, food included"""
+    state = engine.state
+    grid = state.grid
+    if state.food is not None:
+        grid.remove_item(grid.index(state.food))
+        state.food = None
+    for cell in range(grid.width * grid.height):
+        if cell not in keep_open:
+            grid.occupy(cell, PLAYER_OWNER)
+
+def test_food_goes_to_the_last_open_cell():
+    engine = Engine(8, 6, RIVALS)
+    engine.reset(2)
+    fill_board(engine, keep_open={13})
+    engine.spawn_food()
+    assert engine.state.food == (5, 1)
+    assert engine.state.grid.items[13] == ITEM_FOOD
+    assert engine.state.grid.open_count() == 0
+    assert not engine.state.board_full
+
+def test_full_board_ends_the_game_and_stops_spawns():
+    engine = Engine(8, 6, RIVALS)
+    engine.reset(2)
+    fill_board(engine)
+    assert engine._find_safe_spawn_position() is None
+    engine.spawn_food()
+    state = engine.state
+    assert state.food is None
+    assert state.board_full and state.game_over
+
+def test_spawns_only_land_on_open_cells():
+    engine = Engine(12, 9, RIVALS)
+    engine.reset(4)
+    grid = engine.state.grid
+    rng = random.Random(4)
+    for cell in rng.sample(range(12 * 9), 80):
+        if grid.cells[cell] == EMPTY_CELL and grid.items[cell] == NO_ITEM:
+            grid.occupy(cell, PLAYER_OWNER)
+    for _ in range(200):
+        engine.spawn_food()
+        food = grid.index(engine.state.food)
+        assert grid.cells[food] == EMPTY_CELL and grid.items[food] == ITEM_FOOD
+        position = engine._find_safe_spawn_position()
+        if position is not None:
+            cell = grid.index(position)
+            assert grid.cells[cell] == EMPTY_CELL and grid.items[cell] == NO_ITEM
+
+def test_snake_ring_buffer_wraps_and_grows():
+    snake = Snake(10, 0, PLAYER_OWNER, capacity=4)
+    body = [0]
+    # Move well past the capacity so head and tail wrap around the buffer
+    for cell in range(1, 30):
+        snake.push_head(cell)
+        body.insert(0, cell)
+        if cell % 3:
+            assert snake.pop_tail() == body.pop()
+        assert list(snake) == body
+        assert snake.head == body[0]
+        assert snake.tail == body[-1]
+        assert len(snake) == len(body)
+        assert [snake[i] for i in range(len(snake))] == body
+
+def test_snake_positions_unpack_cells():
+    snake = Snake(10, 12, PLAYER_OWNER)
+    snake.push_head(13)
+    assert list(snake.positions()) == [(3, 1), (2, 1)]
+
+def test_scheduler_runs_events_by_due_time_then_scheduling_order():
+    events = EventScheduler()
+    fired = []
+    events.schedule('late', 30, lambda: fired.append(('late', events.now)))
+    events.schedule('first', 10, lambda: fired.append(('first', events.now)))
+    events.schedule('second', 10, lambda: fired.append(('second', events.now)))
+    events.advance(9)
+    assert fired == []
+    events.advance(25)
+    assert fired == [('first', 10), ('second', 10), ('late', 30)]
+    assert events.now == 34
+
+def test_scheduler_replaces_events_with_the_same_name():
+    events = EventScheduler()
+    fired = []
+    events.schedule('spawn', 10, lambda: fired.append('old'))
+    events.schedule('spawn', 20, lambda: fired.append('new'))
+    events.advance(100)
+    assert fired == ['new']
+
+def test_scheduler_cancel_drops_only_the_named_event():
+    events = EventScheduler()
+    fired = []
+    events.schedule('spawn', 10, lambda: fired.append('spawn'))
+    events.schedule('second', 10, lambda: fired.append('second'))
+    events.cancel('spawn')
+    events.cancel('missing')
+    events.advance(100)
+    assert fired == ['second']
+
+def test_scheduler_reschedules_periodic_events_from_their_due_time():
+    events = EventScheduler()
+    fired = []
+
+    def tick():
+        fired.append(events.now)
+        events.schedule('tick', 40, tick)
+    events.schedule('tick', 40, tick)
+    events.advance(30)
+    events.advance(100)
+    assert fired == [40, 80, 120]
+
+def test_engine_keeps_grid_consistent_with_bodies():
+    engine = Engine(20, 15, RIVALS)
+    engine.spawn_interval = 1
+    engine.reset(7)
+    rng = random.Random(7)
+    for _ in range(400):
+        engine.steer(rng.choice(MOVES))
+        if not engine.step():
+            break
+        state = engine.state
+        owners = {cell: PLAYER_OWNER for cell in state.snake}
+        for ai in state.ai_snakes:
+            for cell in ai:
+                assert cell not in owners
+                owners[cell] = ai.owner
+        grid = state.grid
+        assert {i: grid.owner_at(i) for i in range(len(grid.cells)) if grid.owner_at(i) != EMPTY_CELL} == owners
+        assert set(grid._open) == open_cells(grid)
+
+def test_switching_to_no_rivals_cancels_the_next_spawn():
+    engine = Engine(20, 15, RIVALS)
+    engine.spawn_interval = 1
+    engine.reset(1)
+    spawns = []
+    engine._spawn_rival = lambda: spawns.append(engine.state.events.now)
+    engine.switch_rivals([])
+    engine.state.events.advance(5000)
+    assert spawns == []
+    engine.switch_rivals(RIVALS)
+    engine.state.events.advance(1000)
+    assert spawns == [6000]
+
+def lone_player(length=3):
+    """Engine without rivals whose player is `length` cells long, heading right"""
+    engine = Engine(20, 15)
+    engine.reset(1)
+    state = engine.state
+    grid = state.grid
+    if state.food is not None:
+        grid.remove_item(grid.index(state.food))
+        state.food = (0, 0)
+        grid.place_item(0, ITEM_FOOD)
+    for _ in range(length - 1):
+        cell = state.snake.head + 1
+        state.snake.push_head(cell)
+        grid.occupy(cell, PLAYER_OWNER)
+    return engine
+
+def test_each_tick_takes_one_queued_turn():
+    engine = lone_player()
+    engine.steer(UP)
+    engine.steer(LEFT)
+    assert engine.state.direction == RIGHT
+    directions = []
+    for _ in range(3):
+        engine.step()
+        directions.append(engine.state.direction)
+    assert directions == [UP, LEFT, LEFT]
+
+def test_corner_pressed_within_one_tick_is_played():
+    engine = lone_player()
+    x, y = engine.state.grid.position(engine.state.snake.head)
+    engine.steer(UP)
+    engine.steer(LEFT)
+    engine.step()
+    engine.step()
+    assert engine.state.grid.position(engine.state.snake.head) == (x - 1, y - 1)
+    assert not engine.state.game_over
+
+def test_reversal_is_judged_against_the_last_queued_turn():
+    engine = lone_player()
+    engine.steer(UP)
+    engine.steer(DOWN)  # Reverses the queued Up
+    engine.steer(UP)  # Repeats it
+    assert [turn for turn, stamp in engine.state.input_queue] == [UP]
+    engine.steer(LEFT)  # Reverses the current direction, but not the queued Up
+    assert [turn for turn, stamp in engine.state.input_queue] == [UP, LEFT]
+    assert engine.state.dropped_inputs == 0
+
+def test_presses_past_the_queue_size_are_dropped():
+    engine = lone_player()
+    turns = [UP, LEFT, DOWN, LEFT, RIGHT]
+    for turn in turns:
+        engine.steer(turn)
+    assert len(engine.state.input_queue) == INPUT_QUEUE_SIZE
+    assert engine.state.dropped_inputs == len(turns) - INPUT_QUEUE_SIZE
+    assert [turn for turn, stamp in engine.state.input_queue] == turns[:INPUT_QUEUE_SIZE]
+
+def test_stamps_come_back_once_their_turn_is_taken():
+    engine = lone_player()
+    engine.steer(UP, stamp=1.0)
+    engine.steer(DOWN, stamp=2.0)  # Rejected, so never applied
+    engine.steer(LEFT, stamp=3.0)
+    assert engine.take_applied_inputs() == []
+    engine.step()
+    assert engine.take_applied_inputs() == [1.0]
+    assert engine.take_applied_inputs() == []
+    engine.step()
+    engine.step()
+    assert engine.take_applied_inputs() == [3.0]
+
+def crowded_grid(width, height, seed):
+    grid = OccupancyGrid(width, height)
+    rng = random.Random(seed)
+    for cell in rng.sample(range(width * height), width * height // 3):
+        grid.occupy(cell, PLAYER_OWNER)
+    source = grid.random_open_cell(rng)
+    return grid, source
+
+def full_fill(field, grid, source):
+    field.start(grid, source)
+    field.advance(WHOLE_FILL)
+    return list(field.distances)
+
+def spread_fill(field, grid, source, seed):
+    """Fill 30 cells a tick while cells are occupied and vacated between ticks"""
+    rng = random.Random(seed)
+    field.start(grid, source)
+    while field.advance(30) <= 0 and field.filling:
+        for cell in rng.sample(range(grid.width * grid.height), 10):
+            if grid.owner_at(cell) == EMPTY_CELL:
+                grid.occupy(cell, FIRST_AI_OWNER)
+            else:
+                grid.vacate(cell, grid.owner_at(cell))
+    return list(field.distances)
+
+def test_flood_fill_with_and_without_numpy_agree(monkeypatch):
+    pytest.importorskip('numpy')
+    grid, source = crowded_grid(31, 17, 5)
+    with_numpy = full_fill(FoodDistanceField(31, 17), grid, source)
+    spread_with_numpy = spread_fill(FoodDistanceField(31, 17), crowded_grid(31, 17, 5)[0], source, 1)
+    monkeypatch.setattr(snake_engine, 'np', None)
+    without_numpy = full_fill(FoodDistanceField(31, 17), grid, source)
+    spread_without_numpy = spread_fill(FoodDistanceField(31, 17), crowded_grid(31, 17, 5)[0], source, 1)
+    assert with_numpy == without_numpy
+    assert with_numpy[source] == 0
+    assert all(with_numpy[cell] == UNREACHABLE for cell in range(31 * 17) if not grid.is_free(cell))
+    # Both route around the cells occupied when the fill started
+    assert spread_with_numpy == spread_without_numpy == with_numpy
+
+def test_flood_games_play_the_same_with_and_without_numpy(monkeypatch):
+    pytest.importorskip('numpy')
+    digests = []
+    for _ in range(2):
+        engine = Engine(60, 40, RIVALS)
+        engine.ai_mode = AI_FLOOD
+        engine.ai_fill_budget = 200
+        recording = play(engine, 8, 600)
+        digests.append((recording.ticks, recording.final_digest))
+        monkeypatch.setattr(snake_engine, 'np', None)
+    assert digests[0] == digests[1]
+
+def test_rivals_move_greedily_until_the_field_reaches_moved_food():
+    engine = Engine(60, 40, RIVALS)
+    engine.ai_mode = AI_FLOOD
+    engine.ai_fill_budget = 200
+    engine.reset(3)
+    state = engine.state
+    engine._fill_budget = WHOLE_FILL
+    assert engine._food_distances() is engine.food_field
+    engine.spawn_food()
+    engine.food_field.invalidate()
+    engine._fill_budget = 200
+    assert engine._food_distances() is None
+    assert engine.food_field.source != state.grid.index(state.food)
+
+def test_flood_fill_spreads_over_ticks_and_keeps_the_last_field():
+    grid, source = crowded_grid(40, 30, 6)
+    expected = full_fill(FoodDistanceField(40, 30), grid, source)
+    field = FoodDistanceField(40, 30)
+    field.start(grid, source)
+    ticks = 1
+    while field.advance(50) <= 0 and field.filling:
+        assert not field.ready
+        field.invalidate()
+        ticks += 1
+    assert ticks > 1
+    assert list(field.distances) == expected
+    assert field.stats() == {'fills': 1, 'spread_fills': 1, 'last_fill_ticks': ticks}
+    # A second fill leaves the finished field in place until it is done
+    field.invalidate()
+    field.start(grid, grid.random_open_cell(random.Random(1)))
+    field.advance(50)
+    assert field.ready and not field.fresh
+    assert field.source == source and list(field.distances) == expected
+
+def test_flood_mode_replays_with_a_small_fill_budget():
+    engine = Engine(60, 40, RIVALS)
+    engine.ai_mode = AI_FLOOD
+    engine.ai_fill_budget = 200
+    recording = play(engine, 8, 300)
+    assert engine.food_field.spread_fills
+    assert replay(recording).state.digest() == recording.final_digest
+
+def head_on_swarm(walls=()):
+    """Two swarm rivals either side of the food in the top-left corner, player far away"""
+    engine = Engine(20, 15, RIVALS)
+    engine.swarm_size = 2
+    engine.reset(1)
+    engine._clear_ai_snakes()
+    state = engine.state
+    grid = state.grid
+    state.ai_reaction_delay = False
+    engine._add_ai_snake((1, 2), 'a.png')
+    engine._add_ai_snake((3, 2), 'b.png')
+    grid.remove_item(grid.index(state.food))
+    state.food = (2, 2)
+    grid.place_item(grid.index(state.food), ITEM_FOOD)
+    for position in walls:
+        grid.occupy(grid.index(position), PLAYER_OWNER)
+    return engine
+
+def test_swarm_rival_losing_a_cell_takes_its_next_best_move():
+    pytest.importorskip('numpy')
+    engine = head_on_swarm()
+    grid = engine.state.grid
+    heads, moved = engine._plan_ai_moves()
+    # The older rival gets the food; the other goes up, the first of its equally good moves
+    assert moved == [True, True]
+    assert heads == [grid.index((2, 2)), grid.index((3, 1))]
+    assert engine.state.ai_deaths == {}
+
+def test_swarm_rival_dies_only_with_no_free_move_left():
+    pytest.importorskip('numpy')
+    engine = head_on_swarm(walls=[(3, 1), (3, 3), (4, 2)])
+    heads, moved = engine._plan_ai_moves()
+    assert moved == [True, False]
+    assert engine.state.ai_deaths == {AI_DEATH_BLOCKED: 1}
+
+def play(engine, seed, ticks):
+    rng = random.Random(seed)
+    engine.record_games = True
+    engine.reset(seed)
+    for _ in range(ticks):
+        if rng.random() < 0.2:
+            engine.steer(rng.choice(MOVES))
+        if not engine.step():
+            break
+    return engine.finish_recording()
+
+def test_seeded_games_replay_to_the_same_digest(tmp_path):
+    for seed in range(5):
+        engine = Engine(30, 20, RIVALS)
+        engine.spawn_interval = 2
+        recording = play(engine, seed, 600)
+        assert recording.final_digest == engine.state.digest()
+        path = tmp_path / f'game{seed}.snakerec'
+        recording.save(str(path))
+        loaded = Recording.load(str(path))
+        assert loaded.seed == recording.seed
+        assert loaded.events == recording.events
+        assert replay(loaded).state.digest() == recording.final_digest
+
+def test_same_seed_plays_the_same_game():
+    first = play(Engine(30, 20, RIVALS), 11, 300)
+    second = play(Engine(30, 20, RIVALS), 11, 300)
+    assert first.final_digest == second.final_digest
@@ -0,0 +1,64 @@
+"""Tests for the logging helpers (snake_log.py)"""
+import logging
+
+from snake_log import LOG_ENV, RateLimitFilter, log_level
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+def record(msg, *args, line=10, name='snake_engine'):
+    return logging.LogRecord(name, logging.DEBUG, 'snake_engine.py', line, msg, args, None)
+
+def passed(log_filter, records):
+    """Messages of the records the filter lets through"""
+    return [r.getMessage() for r in records if log_filter.filter(r)]
+
+def test_repeats_from_one_call_site_are_dropped_within_the_interval():
+    clock = FakeClock()
+    log_filter = RateLimitFilter(interval=1.0, burst=5, clock=clock)
+    assert passed(log_filter, [record('stalled')] * 4) == ['stalled']
+    clock.now += 1.0
+    assert passed(log_filter, [record('stalled')]) == ['stalled (3 similar messages suppressed)']
+    clock.now += 1.0
+    assert passed(log_filter, [record('stalled')]) == ['stalled']
+
+def test_bursts_are_capped_per_call_site():
+    clock = FakeClock()
+    log_filter = RateLimitFilter(interval=1.0, burst=3, clock=clock)
+    messages = [record('AI snake %d died', i) for i in range(10)]
+    assert passed(log_filter, messages) == ['AI snake 0 died', 'AI snake 1 died', 'AI snake 2 died']
+    clock.now += 0.5
+    assert passed(log_filter, [record('AI snake %d died', 10)]) == []
+    clock.now += 0.5
+    assert passed(log_filter, [record('AI snake %d died', 11)]) == ['AI snake 11 died (8 similar messages suppressed)']
+
+def test_call_sites_are_limited_separately():
+    log_filter = RateLimitFilter(interval=1.0, burst=1, clock=FakeClock())
+    records = [record('same', line=10), record('same', line=20), record('same', line=10, name='screen_snake')]
+    assert passed(log_filter, records) == ['same', 'same', 'same']
+    assert passed(log_filter, records) == []
+
+def test_suppressed_count_formats_without_args():
+    clock = FakeClock()
+    log_filter = RateLimitFilter(interval=1.0, burst=1, clock=clock)
+    passed(log_filter, [record('%d%% done', 50), record('%d%% done', 60)])
+    clock.now += 2
+    kept = record('%d%% done', 70)
+    assert log_filter.filter(kept)
+    assert kept.getMessage() == '70% done (1 similar messages suppressed)'
+    assert kept.args is None
+
+def test_log_level_from_flag_and_environment(monkeypatch):
+    monkeypatch.delenv(LOG_ENV, raising=False)
+    assert log_level() == logging.WARNING
+    assert log_level(verbose=True) == logging.DEBUG
+    monkeypatch.setenv(LOG_ENV, 'info')
+    assert log_level() == logging.INFO
+    monkeypatch.setenv(LOG_ENV, '1')
+    assert log_level() == logging.DEBUG
+    monkeypatch.setenv(LOG_ENV, 'nonsense')
+    assert log_level() == logging.WARNING
@@ -0,0 +1,88 @@
+"""Tests for game recordings (snake_recording.py) and headless replay (snake_replay.py)"""
+import random
+
+import pytest
+
+from snake_engine import MOVES, Engine
+from snake_recording import (EVENT_PAUSE, EVENT_RESUME, EVENT_RIVALS, EVENT_STEER, RECORDING_VERSION,
+                              Recording)
+from snake_replay import iter_replay, replay
+
+RIVALS = ['a.png', 'b.png', 'c.png']
+OTHER_RIVALS = ['x.png', 'y.png']
+
+def test_save_and_load_keep_header_and_events(tmp_path):
+    recording = Recording(42, 30, 20, {'base_speed': 80}, RIVALS)
+    recording.add(0, EVENT_STEER + 2)
+    recording.add(7, EVENT_PAUSE)
+    recording.add(7, EVENT_RESUME)
+    recording.add(9, EVENT_RIVALS + recording.rival_set(OTHER_RIVALS))
+    recording.ticks = 12
+    recording.final_digest = 'abc'
+    path = str(tmp_path / 'game.snakerec')
+    recording.save(path)
+
+    loaded = Recording.load(path)
+    assert (loaded.seed, loaded.grid_width, loaded.grid_height) == (42, 30, 20)
+    assert loaded.settings == {'base_speed': 80}
+    assert loaded.rival_sets == [RIVALS, OTHER_RIVALS]
+    assert list(loaded) == [(0, 2), (7, EVENT_PAUSE), (7, EVENT_RESUME), (9, EVENT_RIVALS + 1)]
+    assert len(loaded) == 4
+    assert (loaded.ticks, loaded.final_digest) == (12, 'abc')
+
+def test_rival_sets_are_stored_once():
+    recording = Recording(1, 10, 10, {}, RIVALS)
+    assert recording.rival_set(RIVALS) == 0
+    assert recording.rival_set(OTHER_RIVALS) == 1
+    assert recording.rival_set(tuple(OTHER_RIVALS)) == 1
+    assert recording.rival_sets == [RIVALS, OTHER_RIVALS]
+
+def test_load_rejects_other_files(tmp_path):
+    path = tmp_path / 'not_a_game.snakerec'
+    path.write_bytes(b'PNGIMAGE' + bytes(64))
+    with pytest.raises(ValueError):
+        Recording.load(str(path))
+
+def test_load_rejects_other_formats(tmp_path):
+    path = str(tmp_path / 'game.snakerec')
+    Recording(1, 10, 10, {}, RIVALS).save(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(data.replace(b'"version":%d' % RECORDING_VERSION, b'"version":9'))
+    with pytest.raises(ValueError):
+        Recording.load(path)
+
+def play_with_every_input(engine, seed, ticks):
+    """Steer, pause and switch rivals at random"""
+    rng = random.Random(seed)
+    engine.record_games = True
+    engine.reset(seed)
+    for _ in range(ticks):
+        roll = rng.random()
+        if roll < 0.2:
+            engine.steer(rng.choice(MOVES))
+        elif roll < 0.22:
+            engine.set_paused(True)
+            engine.steer(rng.choice(MOVES))
+            engine.set_paused(False)
+        elif roll < 0.23:
+            engine.switch_rivals(rng.choice([RIVALS, OTHER_RIVALS]))
+        if not engine.step():
+            break
+    return engine.finish_recording()
+
+def test_replay_reproduces_pauses_switches_and_timed_spawns():
+    for seed in range(4):
+        engine = Engine(30, 20, RIVALS)
+        engine.spawn_interval = 2
+        recording = play_with_every_input(engine, seed, 500)
+        replayed = replay(recording)
+        assert replayed.state.digest() == recording.final_digest
+        assert replayed.state.elapsed_time == engine.state.elapsed_time
+
+def test_iter_replay_yields_every_tick():
+    engine = Engine(30, 20, RIVALS)
+    recording = play_with_every_input(engine, 3, 200)
+    ticks = [replayed.state.ticks for replayed in iter_replay(recording)]
+    assert ticks == list(range(1, recording.ticks + 1))
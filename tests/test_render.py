@@ -0,0 +1,62 @@
+"""Tests for the display-independent parts of snake_render.py"""
+import pytest
+
+pytest.importorskip('PyQt5')
+
+from snake_render import (HEADROOM_WINDOWS, QUALITY_FULL, QUALITY_MINIMAL, QUALITY_PLAIN,
+                          RenderGovernor)
+
+def feed(governor, ms, count, tick_ms=100, frame_ms=16):
+    """Record `count` paints of `ms` each, adjusting after every one; returns the tiers changed to"""
+    changes = []
+    for _ in range(count):
+        governor.record(ms)
+        if governor.adjust(tick_ms, frame_ms):
+            changes.append(governor.tier)
+    return changes
+
+def test_budget_follows_the_tick_interval():
+    governor = RenderGovernor()
+    governor.adjust(100, 16)
+    assert governor.budget_ms == pytest.approx(10)
+    governor.adjust(30, 16)
+    assert governor.budget_ms == pytest.approx(3)
+    # ...but a paint may never take longer than a frame
+    governor.adjust(100, 7)
+    assert governor.budget_ms == 7
+
+def test_slow_paints_step_quality_down_one_tier_per_window():
+    governor = RenderGovernor(window=10)
+    assert feed(governor, 5, 10) == []
+    assert feed(governor, 12, 10) == [QUALITY_PLAIN]
+    assert feed(governor, 12, 10) == [QUALITY_MINIMAL]
+    assert feed(governor, 12, 30) == []
+    assert governor.tier == QUALITY_MINIMAL
+
+def test_the_same_paints_overrun_only_at_faster_speeds():
+    governor = RenderGovernor(window=10)
+    assert feed(governor, 5, 20, tick_ms=100) == []
+    assert feed(governor, 5, 10, tick_ms=30) == [QUALITY_PLAIN]
+
+def test_a_few_slow_paints_are_tolerated():
+    governor = RenderGovernor(window=8)
+    assert feed(governor, 5, 6) + feed(governor, 12, 2) == []
+    assert governor.tier == QUALITY_FULL
+
+def test_headroom_steps_quality_back_up():
+    governor = RenderGovernor(window=10)
+    feed(governor, 12, 20)
+    assert governor.tier == QUALITY_MINIMAL
+    calm = 10 * HEADROOM_WINDOWS
+    assert feed(governor, 1, calm - 1) == []
+    assert feed(governor, 1, 1) == [QUALITY_PLAIN]
+    assert feed(governor, 1, calm) == [QUALITY_FULL]
+    assert feed(governor, 1, calm) == []
+    assert governor.changes == 4
+
+def test_a_paint_without_headroom_restarts_the_calm_count():
+    governor = RenderGovernor(window=10)
+    feed(governor, 12, 10)
+    calm = 10 * HEADROOM_WINDOWS
+    assert feed(governor, 1, calm - 1) + feed(governor, 5, 1) + feed(governor, 1, calm - 1) == []
+    assert feed(governor, 1, 1) == [QUALITY_FULL]